@@ -0,0 +1,525 @@
+import argparse
+import contextlib
+import copy
+import json
+import os
+import random
+import resource
+import shutil
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from yt_dlp.cookies import YoutubeDLCookieJar
+
+import main
+from models import StreamStatus, Video, snapshot_from_json
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures" / "streams"
+ENTRY_FIELDS = (
+    "id",
+    "title",
+    "live_status",
+    "release_timestamp",
+    "thumbnails",
+    "description",
+)
+
+
+def bench_fetch(args):
+    channel_urls = main.get_channel_url(args.file)[: args.channels]
+    cookies = main.CookieStore.load()
+    results = {}
+    for mode in args.modes:
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            upcoming, live_streams = main.fetch_channels(
+                channel_urls, cookies=cookies, mode=mode
+            )
+            timings.append(time.perf_counter() - start)
+        results[mode] = (
+            min(timings),
+            sum(len(info.videos) for info in upcoming.values()),
+            sum(len(info.videos) for info in live_streams.values()),
+            len(upcoming),
+        )
+
+    print(f"\n>>> {len(channel_urls)} channels, best of {args.repeat}")
+    for mode, (best, n_upcoming, n_live, n_channels) in results.items():
+        print(
+            f"{mode:>8}: {best:8.2f}s  channels={n_channels} upcoming={n_upcoming} live={n_live}"
+        )
+
+
+def bench_extract(args):
+    """Bytes and time of the /streams extraction, bounded against the full tab."""
+    channel_urls = main.get_channel_url(args.file)[: args.channels]
+    cookies = main.CookieStore.load()
+    full_opts = {
+        key: value
+        for key, value in main.YT_OPTS.items()
+        if key not in ("playlistend", "lazy_playlist")
+    }
+    results = {}
+    for name, opts in (
+        (
+            f"first {args.items}",
+            {**full_opts, "playlistend": args.items, "lazy_playlist": True},
+        ),
+        ("full tab", full_opts),
+    ):
+        main.YT_OPTS = opts
+        main.STREAMS_MAX_ITEMS = args.items if "playlistend" in opts else 0
+        main.run_metrics = None
+        start = time.perf_counter()
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            upcoming, live_streams = main.process_channels(channel_urls, 10, cookies)
+        report = main.get_metrics().report()
+        results[name] = (
+            time.perf_counter() - start,
+            report["fetch"]["bytes"],
+            sum(len(info.videos) for info in upcoming.values()),
+            sum(len(info.videos) for info in live_streams.values()),
+        )
+
+    print(f">>> {len(channel_urls)} channels")
+    for name, (seconds, bytes_, n_upcoming, n_live) in results.items():
+        print(
+            f"{name:>10}: {seconds:8.2f}s {bytes_ / 2**20:9.2f} MiB  upcoming={n_upcoming} live={n_live}"
+        )
+    (bounded_s, bounded_b, *_), (full_s, full_b, *_) = results.values()
+    print(
+        f"saved {(full_b - bounded_b) / 2**20:.2f} MiB"
+        f" ({1 - bounded_b / full_b:.0%}) and {full_s - bounded_s:.2f}s"
+        if full_b
+        else "nothing downloaded"
+    )
+
+
+def make_videos(count: int, seed: int = 0) -> list[dict]:
+    rng = random.Random(seed)
+    words = (
+        "morning chat game minecraft apex collab birthday closing contest "
+        "雑談 ゲーム 3D お知らせ live stream members only"
+    ).split()
+    keywords = [
+        keyword for config in main.FILTERS.values() for keyword in config["filter"]
+    ]
+    videos = []
+    for index in range(count):
+        title = " ".join(rng.choices(words, k=6))
+        if rng.random() < 0.3:
+            title += " " + rng.choice(keywords)
+        videos.append(
+            {
+                "video_id": f"video{index:07d}",
+                "title": f"【{title}】",
+                "description": " ".join(rng.choices(words, k=30)),
+            }
+        )
+    return videos
+
+
+def bench_filters(args):
+    videos = make_videos(args.videos)
+
+    def loop_filters():
+        for video in videos:
+            for config in main.FILTERS.values():
+                main.count_title_description(
+                    0, video["title"], video["description"], config["filter"]
+                )
+
+    def matcher_filters():
+        matcher = main.FilterMatcher(main.FILTERS)
+        for video in videos:
+            matcher.match(video["title"], video["description"])
+
+    models = [Video.from_dict(video, StreamStatus.UPCOMING) for video in videos]
+
+    def matcher_cached():
+        matcher = main.FilterMatcher(main.FILTERS)
+        for _ in range(2):  # one pass per email builder
+            for video in models:
+                matcher.match_video(video)
+
+    def loop_twice():
+        for _ in range(2):
+            loop_filters()
+
+    print(f">>> {len(videos)} videos, best of {args.repeat}")
+    for name, func in (
+        ("substring loop", loop_filters),
+        ("compiled matcher", matcher_filters),
+        ("loop x2 (both emails)", loop_twice),
+        ("matcher x2 cached", matcher_cached),
+    ):
+        best = min(timed(func) for _ in range(args.repeat))
+        print(f"{name:>22}: {best * 1000:9.2f} ms")
+
+
+def make_snapshot(channels: int, videos: int, seed: int = 0) -> dict:
+    """Upcoming snapshot (channel_id -> Channel) of synthetic channels."""
+    rng = random.Random(seed)
+    titles = make_videos(channels * videos, seed)
+    now = datetime.now()
+    snapshot = {}
+    for index in range(channels):
+        channel_videos = []
+        for video in titles[index * videos : (index + 1) * videos]:
+            date = now + timedelta(minutes=rng.randint(1, 3 * 24 * 60))
+            channel_videos.append(
+                {
+                    **video,
+                    "thumbnail": f"https://i.ytimg.com/vi/{video['video_id']}/hqdefault.jpg",
+                    "date": date.strftime("%Y/%m/%d %H:%M:%S"),
+                }
+            )
+        snapshot[f"UC{index:022d}"] = {
+            "channel_name": f"Channel {index}",
+            "channel_url": f"https://www.youtube.com/@channel{index}",
+            "avatar_url": "https://yt3.googleusercontent.com/avatar",
+            "videos": channel_videos,
+        }
+    return snapshot_from_json(snapshot, StreamStatus.UPCOMING)
+
+
+def bench_render(args):
+    snapshot = make_snapshot(args.channels, args.videos)
+    # titles.db and render_cache.json of the benchmark stay out of the repo
+    os.chdir(tempfile.mkdtemp(prefix="render-bench-"))
+    main.render_cache = main.BlockCache(path="render_cache.json")
+    # a real run has every title translated before rendering
+    cache = main.get_title_cache()
+    for info in snapshot.values():
+        for video in info.videos:
+            cache.store(video.title, video.title.upper())
+
+    def render_both():
+        main.build_email_upcoming(snapshot, [])
+        main.build_email_live(snapshot, [])
+
+    cold = timed(render_both)
+    main.render_cache.save()
+    main.render_cache = main.BlockCache(path="render_cache.json")  # next run
+    warm = min(timed(render_both) for _ in range(args.repeat))
+    size = len(main.build_email_upcoming(snapshot, [])["body"])
+
+    print(
+        f">>> {args.channels} channels x {args.videos} videos, body {size / 1024:.0f} KiB"
+    )
+    print(f"{'cold (empty cache)':>22}: {cold * 1000:9.2f} ms")
+    print(f"{'warm (cached blocks)':>22}: {warm * 1000:9.2f} ms")
+    print(main.render_cache.stats())
+
+
+def record_fixtures(args):
+    """Save trimmed /streams extract_info payloads for the offline benchmark."""
+    FIXTURES_DIR.mkdir(parents=True, exist_ok=True)
+    channel_urls = main.get_channel_url(args.file)[: args.channels]
+    pool = main.YoutubeDLPool(main.YT_OPTS, main.CookieStore.load())
+    ydl = pool.get()
+    for index, channel_url in enumerate(channel_urls):
+        try:
+            result = ydl.extract_info(channel_url + "/streams", download=False)
+        except Exception as e:
+            print(f"skip {channel_url}: {e}")
+            continue
+        payload = {
+            "uploader_id": result.get("uploader_id"),
+            "channel": result.get("channel"),
+            "channel_id": result.get("channel_id"),
+            "entries": [
+                {field: entry.get(field) for field in ENTRY_FIELDS}
+                for entry in result.get("entries", [])
+            ],
+        }
+        path = FIXTURES_DIR / f"{index:03d}.json"
+        with open(path, mode="w", encoding="utf-8") as file:
+            json.dump(
+                {
+                    "recorded_at": int(time.time()),
+                    "channel_url": channel_url,
+                    "payload": payload,
+                },
+                file,
+                ensure_ascii=False,
+                indent=1,
+            )
+        print(f"recorded {channel_url} -> {path.name}")
+    pool.close()
+
+
+def synthetic_fixture(index: int, rng: random.Random) -> dict:
+    """Same shape as a recorded fixture, used when none were recorded."""
+    now = int(time.time())
+    entries = []
+    for video in make_videos(30, seed=index):
+        status = rng.choices(
+            ["is_upcoming", "is_live", "was_live", "not_live"], [2, 1, 10, 5]
+        )[0]
+        entries.append(
+            {
+                "id": f"{index:04d}{video['video_id'][-7:]}",
+                "title": video["title"],
+                "live_status": status,
+                "release_timestamp": now + rng.randint(60, 5 * 24 * 60 * 60),
+                "thumbnails": [
+                    {"url": f"https://i.ytimg.com/vi/{index}/{size}.jpg"}
+                    for size in ("default", "mqdefault", "hqdefault")
+                ],
+                "description": video["description"],
+            }
+        )
+    rng.shuffle(entries)
+    return {
+        "recorded_at": now,
+        "channel_url": f"https://www.youtube.com/@synthetic{index}",
+        "payload": {
+            "uploader_id": f"@synthetic{index}",
+            "channel": f"Synthetic {index}",
+            "channel_id": f"UC{index:022d}",
+            "entries": entries,
+        },
+    }
+
+
+def load_fixtures() -> list[dict]:
+    fixtures = []
+    for path in sorted(FIXTURES_DIR.glob("*.json")):
+        with open(path, mode="r", encoding="utf-8") as file:
+            fixtures.append(json.load(file))
+    return fixtures
+
+
+def scale_fixtures(fixtures: list[dict], channels: int, videos: int) -> dict:
+    """
+    channel_url -> payload for `channels` channels, cycling through the
+    fixtures with unique ids, `videos` entries per channel and the schedule
+    shifted so recorded upcoming streams are still in the future.
+    """
+    rng = random.Random(0)
+    if not fixtures:
+        fixtures = [synthetic_fixture(index, rng) for index in range(75)]
+    now = int(time.time())
+    payloads = {}
+    for index in range(channels):
+        fixture = fixtures[index % len(fixtures)]
+        payload = copy.deepcopy(fixture["payload"])
+        suffix = f"-{index // len(fixtures)}" if index >= len(fixtures) else ""
+        payload["uploader_id"] = f"{payload['uploader_id']}{suffix}"
+        shift = now - fixture["recorded_at"]
+        entries = payload["entries"]
+        while entries and len(entries) < videos:
+            entries = entries + copy.deepcopy(entries)
+        payload["entries"] = entries[:videos]
+        for position, entry in enumerate(payload["entries"]):
+            entry["id"] = f"{entry['id']}{suffix}-{position}"
+            if entry.get("release_timestamp"):
+                entry["release_timestamp"] += shift
+        payloads[f"{fixture['channel_url']}{suffix}"] = payload
+    return payloads
+
+
+class ReplayYoutubeDL:
+    """Stands in for yt_dlp.YoutubeDL, extract_info returns the recorded payload."""
+
+    def __init__(self, payloads: dict):
+        self.payloads = payloads
+        self.cookiejar = YoutubeDLCookieJar()
+
+    def extract_info(self, url: str, download: bool = False) -> dict:
+        return copy.deepcopy(self.payloads[url.removesuffix("/streams")])
+
+    def close(self) -> None:
+        pass
+
+
+class ReplayPool(main.YoutubeDLPool):
+    def __init__(self, payloads: dict):
+        super().__init__(main.YT_OPTS)
+        self.payloads = payloads
+
+    def get(self) -> ReplayYoutubeDL:
+        ydl = getattr(self._local, "ydl", None)
+        if ydl is None:
+            ydl = self._local.ydl = ReplayYoutubeDL(self.payloads)
+            with self._lock:
+                self.created += 1
+                self._instances.append(ydl)
+        return ydl
+
+
+class StubTransport(main.MailTransport):
+    """Serializes the message like smtplib would, without a server."""
+
+    last_size = 0
+
+    def send(self, msg) -> None:
+        self.last_size = len(msg.as_bytes())
+        self.sent += 1
+
+
+class StubWebhook(main.DiscordWebhook):
+    def post(self, payload: dict) -> bool:
+        json.dumps(payload)
+        self.sent += 1
+        return True
+
+
+def bench_offline(args):
+    payloads = scale_fixtures(load_fixtures(), args.channels, args.videos)
+    channel_urls = list(payloads)
+    # state.db, titles.db and render_cache.json of the benchmark stay out of the
+    # repo, parse_streams_result still needs vtuber.json for the avatars
+    workdir = tempfile.mkdtemp(prefix="offline-bench-")
+    shutil.copy(main.get_registry().path, workdir)
+    os.chdir(workdir)
+    main.mail_transport = StubTransport()
+    # replayed payloads are local, the token bucket would only measure itself
+    main.fetch_governor = main.FetchGovernor(rate=float("inf"))
+    main.DISCORD_WEBHOOK_URL = "https://discord.invalid/webhook"
+    main.discord_webhooks[main.DISCORD_WEBHOOK_URL] = StubWebhook(
+        main.DISCORD_WEBHOOK_URL
+    )
+    state = {}
+
+    def fetch():
+        state["upcoming"], state["live"] = main.process_channels(
+            channel_urls,
+            args.workers,
+            cookies=main.CookieStore(YoutubeDLCookieJar()),
+            pool=ReplayPool(payloads),
+        )
+
+    def single_channel():
+        main.get_info_livestream(channel_urls[0], ReplayPool(payloads))
+
+    stages = [
+        ("get_info_livestream x1", single_channel),
+        ("process_channels", fetch),
+        ("hash_channels", lambda: main.hash_channels(state["upcoming"])),
+        (
+            "build_email_upcoming",
+            lambda: main.build_email_upcoming(state["upcoming"], []),
+        ),
+        ("build_email_live", lambda: main.build_email_live(state["live"], [])),
+        (
+            "send_email_upcoming",
+            lambda: main.send_email_upcoming(state["upcoming"], []),
+        ),
+        ("send_email_live", lambda: main.send_email_live(state["live"], [])),
+        (
+            "save_snapshots",
+            lambda: main.save_snapshots(state["upcoming"], state["live"]),
+        ),
+    ]
+
+    results = {}
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for name, func in stages:
+            results[name] = [timed(func)]
+        if args.memory:
+            tracemalloc.start()
+            for name, func in stages:
+                main.hash_store = None  # the send_* stages resend every pass
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+                func()
+                results[name].append(tracemalloc.get_traced_memory()[1] - before)
+            tracemalloc.stop()
+
+    n_upcoming = sum(len(info.videos) for info in state["upcoming"].values())
+    n_live = sum(len(info.videos) for info in state["live"].values())
+    print(
+        f">>> {len(channel_urls)} channels x {args.videos} entries"
+        f" ({n_upcoming} upcoming, {n_live} live, {args.workers} workers)"
+    )
+    for name, result in results.items():
+        memory = f"  peak {result[1] / 2**20:8.2f} MiB" if len(result) > 1 else ""
+        print(f"{name:>22}: {result[0] * 1000:10.2f} ms{memory}")
+    print(f"{'total':>22}: {sum(r[0] for r in results.values()) * 1000:10.2f} ms")
+    # ru_maxrss is KiB on Linux
+    print(
+        f"process max RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MiB"
+    )
+    print(
+        f"email body: {main.mail_transport.last_size / 1024:.0f} KiB (last),"
+        f" Discord chunks: {main.discord_webhooks[main.DISCORD_WEBHOOK_URL].sent}"
+    )
+
+
+def timed(func) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="check-livestreams benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    fetch_parser = subparsers.add_parser(
+        "fetch", help="compare the thread and async fetch engines (needs network)"
+    )
+    fetch_parser.add_argument("--file", default="channel_url.txt")
+    fetch_parser.add_argument("--channels", type=int, default=None)
+    fetch_parser.add_argument("--repeat", type=int, default=1)
+    fetch_parser.add_argument(
+        "--modes", nargs="+", default=["thread", "async"], choices=["thread", "async"]
+    )
+    fetch_parser.set_defaults(func=bench_fetch)
+
+    extract_parser = subparsers.add_parser(
+        "extract",
+        help="bytes downloaded with STREAMS_MAX_ITEMS against the full tab (needs network)",
+    )
+    extract_parser.add_argument("--file", default="channel_url.txt")
+    extract_parser.add_argument("--channels", type=int, default=10)
+    extract_parser.add_argument(
+        "--items", type=int, default=main.STREAMS_MAX_ITEMS or 15
+    )
+    extract_parser.set_defaults(func=bench_extract)
+
+    filters_parser = subparsers.add_parser(
+        "filters", help="compiled FILTERS matcher against the substring loop"
+    )
+    filters_parser.add_argument("--videos", type=int, default=10000)
+    filters_parser.add_argument("--repeat", type=int, default=3)
+    filters_parser.set_defaults(func=bench_filters)
+
+    render_parser = subparsers.add_parser(
+        "render", help="both email builders on a synthetic snapshot"
+    )
+    render_parser.add_argument("--channels", type=int, default=1000)
+    render_parser.add_argument("--videos", type=int, default=3)
+    render_parser.add_argument("--repeat", type=int, default=3)
+    render_parser.set_defaults(func=bench_render)
+
+    record_parser = subparsers.add_parser(
+        "record", help="record /streams payloads into fixtures/streams (needs network)"
+    )
+    record_parser.add_argument("--file", default="channel_url.txt")
+    record_parser.add_argument("--channels", type=int, default=None)
+    record_parser.set_defaults(func=record_fixtures)
+
+    offline_parser = subparsers.add_parser(
+        "offline",
+        help="replay recorded payloads through fetch, rendering and sending (no network)",
+    )
+    offline_parser.add_argument("--channels", type=int, default=75)
+    offline_parser.add_argument("--videos", type=int, default=30)
+    offline_parser.add_argument("--workers", type=int, default=10)
+    offline_parser.add_argument(
+        "--no-memory",
+        dest="memory",
+        action="store_false",
+        help="skip the tracemalloc pass for per-stage peak memory",
+    )
+    offline_parser.set_defaults(func=bench_offline)
+
+    args = parser.parse_args()
+    args.func(args)
@@ -0,0 +1,165 @@
+import json
+import os
+import pickle
+import threading
+from pathlib import Path
+
+VTUBER_PATH = "./vtuber.json"
+CACHE_PATH = "./vtuber.cache"
+DEFAULT_AVATAR_URL = "https://yt3.googleusercontent.com/U3KyLvyQRzOrgRHZYEYPQCc1QS2Jx5LnQF_5H6aYDluVM8AOnAZ90U0tSY3aVobgVNlRccieDA"
+
+
+def normalize_channel_url(channel_url: str) -> str:
+    channel_url = channel_url.strip().rstrip("/").lower()
+    if channel_url.endswith("/streams"):
+        channel_url = channel_url[: -len("/streams")]
+    return channel_url.replace("://youtube.com", "://www.youtube.com")
+
+
+class ChannelRegistry:
+    """
+    vtuber.json loaded once and indexed by handle, channel URL and uploader
+    ID. A pickle snapshot keyed by the file mtime/size skips the JSON parse.
+    """
+
+    def __init__(self, data: dict, path: str = VTUBER_PATH):
+        self.data = data
+        self.path = path
+        self.file_key = self._file_key(path) if Path(path).exists() else None
+        self._build_index()
+
+    def _build_index(self) -> None:
+        self._index = {}
+        for handle, channel_data in self.data.items():
+            self._index[handle.lower()] = handle
+            channel_url = channel_data.get("link", {}).get("youtube")
+            if channel_url:
+                self._index[normalize_channel_url(channel_url)] = handle
+                uploader_id = channel_url.rstrip("/").rsplit("/", 1)[-1]
+                self._index[uploader_id.lower()] = handle
+
+    @staticmethod
+    def _file_key(path: str) -> tuple[int, int]:
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+
+    @classmethod
+    def load(
+        cls, path: str = VTUBER_PATH, cache_path: str | None = CACHE_PATH
+    ) -> "ChannelRegistry":
+        file_key = cls._file_key(path)
+        if cache_path and Path(cache_path).exists():
+            try:
+                with open(cache_path, mode="rb") as file:
+                    cached_key, data = pickle.load(file)
+                if cached_key == file_key:
+                    return cls(data, path)
+            except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+                pass
+
+        with open(path, mode="r", encoding="utf-8") as file:
+            data = json.load(file)
+        registry = cls(data, path)
+        if cache_path:
+            registry._write_cache(cache_path)
+        return registry
+
+    def _write_cache(self, cache_path: str = CACHE_PATH) -> None:
+        try:
+            with open(cache_path, mode="wb") as file:
+                pickle.dump(
+                    (self.file_key, self.data),
+                    file,
+                    protocol=pickle.HIGHEST_PROTOCOL,
+                )
+        except OSError as e:
+            print(f"Unable to write {cache_path}: {e}")
+
+    def save(self, cache_path: str | None = CACHE_PATH) -> None:
+        with open(self.path, mode="w", encoding="utf-8") as file:
+            json.dump(self.data, file, ensure_ascii=False, indent=4)
+        self.file_key = self._file_key(self.path)
+        self._build_index()
+        if cache_path:
+            self._write_cache(cache_path)
+
+    def resolve(self, key: str) -> str | None:
+        """Handle (vtuber.json key) of a handle, channel URL or uploader ID."""
+        if not key:
+            return None
+        key = key.strip()
+        if key in self.data:
+            return key
+        return self._index.get(key.lower()) or self._index.get(
+            normalize_channel_url(key)
+        )
+
+    def get(self, key: str, default: dict | None = None) -> dict | None:
+        handle = self.resolve(key)
+        return self.data[handle] if handle else default
+
+    def avatar_url(self, *keys: str, default: str = DEFAULT_AVATAR_URL) -> str:
+        for key in keys:
+            channel_data = self.get(key)
+            if channel_data and channel_data.get("avatar_url"):
+                return channel_data["avatar_url"]
+        return default
+
+    def items(self):
+        return self.data.items()
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __contains__(self, key: str) -> bool:
+        return self.resolve(key) is not None
+
+
+def channel_skeleton(channel_data: dict) -> dict:
+    """Snapshot entry of a tracked channel without videos."""
+    return {
+        "channel_url": channel_data.get("link", {}).get(
+            "youtube", "https://www.youtube.com/@notfound"
+        ),
+        "channel_name": channel_data.get("channel_name", "John Doe Ch."),
+        "avatar_url": channel_data.get("avatar_url", DEFAULT_AVATAR_URL),
+        "videos": [],
+    }
+
+
+def merge_tracked_channels(
+    registry: ChannelRegistry, *snapshots: dict, skeleton=channel_skeleton
+) -> bool:
+    """
+    Make each snapshot hold exactly the channels of the registry, in place:
+    missing channels are added without videos (built by skeleton) and
+    untracked ones removed, the others are left untouched. Returns whether
+    anything changed.
+    """
+    changed = False
+    for snapshot in snapshots:
+        for channel_id in [key for key in snapshot if key not in registry.data]:
+            del snapshot[channel_id]
+            changed = True
+        for channel_id, channel_data in registry.items():
+            if channel_id not in snapshot:
+                snapshot[channel_id] = skeleton(channel_data)
+                changed = True
+    return changed
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry(path: str = VTUBER_PATH) -> ChannelRegistry:
+    """Process-wide registry, reloaded only when vtuber.json changes on disk."""
+    global _registry
+    with _registry_lock:
+        if (
+            _registry is None
+            or _registry.path != path
+            or _registry.file_key != ChannelRegistry._file_key(path)
+        ):
+            _registry = ChannelRegistry.load(path)
+        return _registry
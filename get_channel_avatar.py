@@ -1,41 +1,186 @@
+import argparse
 import json
+import os
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 
 import requests
+from requests.adapters import HTTPAdapter
 
+from channel_registry import ChannelRegistry
+
+AVATAR_STATE_PATH = "avatar_state.json"
+AVATAR_TTL = float(os.getenv("AVATAR_TTL_DAYS") or 7) * 86400
+AVATAR_WORKERS = int(os.getenv("AVATAR_WORKERS") or 8)
+AVATAR_MAX_BYTES = 2 * 1024 * 1024  # the avatar is in the <head>, never this far
+CHUNK_SIZE = 16 * 1024
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.36"
+}
+AVATAR_PATTERN = re.compile(
+    rb"https://yt3\.googleusercontent\.com/(ytc/)?([a-zA-Z0-9_-]+)"
+)  # =s{size}-c-k-c0x00ffffff-no-rj
+
+
+def make_session(workers: int = AVATAR_WORKERS) -> requests.Session:
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def search_stream(response: requests.Response) -> str | None:
+    """Read the page chunk by chunk and stop at the first avatar URL."""
+    buffer = b""
+    read = 0
+    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+        read += len(chunk)
+        buffer += chunk
+        match = AVATAR_PATTERN.search(buffer)
+        # a match touching the end of the buffer may continue in the next chunk
+        if match and match.end() < len(buffer):
+            return match.group(0).decode("ascii")
+        if read >= AVATAR_MAX_BYTES:
+            break
+        # keep enough of the tail for a URL split across chunks
+        buffer = buffer[-512:]
+    match = AVATAR_PATTERN.search(buffer)
+    return match.group(0).decode("ascii") if match else None
+
+
+def get_channel_avatar(
+    channel_url: str,
+    session: requests.Session | None = None,
+    state: dict | None = None,
+) -> str | None:
+    """
+    Avatar URL of a channel, or None when it cannot be found or did not
+    change since the validators stored in state (updated in place).
+    """
+    session = session or make_session(1)
+    state = {} if state is None else state
+    headers = {}
+    if state.get("etag"):
+        headers["If-None-Match"] = state["etag"]
+    if state.get("last_modified"):
+        headers["If-Modified-Since"] = state["last_modified"]
 
-def get_channel_avatar(channel_url):
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.36"
-    }
     print(f">>> Getting data from: {channel_url}")
-    response = requests.get(channel_url, headers=headers)
+    with session.get(channel_url, headers=headers, stream=True, timeout=30) as response:
+        if response.status_code == 304:
+            return None
+        if response.status_code != 200:
+            print(f"Unable to access the channel: {response.status_code}")
+            return None
+        state["etag"] = response.headers.get("ETag")
+        state["last_modified"] = response.headers.get("Last-Modified")
+        avatar_url = search_stream(response)
+
+    if not avatar_url:
+        print("Not found the avatar URL for this channel!")
+    return avatar_url
+
+
+class AvatarRefresher:
+    """
+    Refresh the avatar of each channel in vtuber.json whose last check is
+    older than the TTL, a few channels at a time over one pooled session.
+    """
+
+    def __init__(
+        self,
+        registry: ChannelRegistry,
+        state_path: str = AVATAR_STATE_PATH,
+        ttl: float = AVATAR_TTL,
+        workers: int = AVATAR_WORKERS,
+    ):
+        self.registry = registry
+        self.state_path = state_path
+        self.ttl = ttl
+        self.workers = workers
+        self.state = {}
+        self.changed = 0
+        self._lock = threading.Lock()
+        if Path(state_path).exists():
+            try:
+                with open(state_path, mode="r", encoding="utf-8") as file:
+                    self.state = json.load(file)
+            except (OSError, ValueError):
+                self.state = {}
 
-    if response.status_code == 200:
-        match = re.search(
-            r"https://yt3\.googleusercontent\.com/(ytc/)?([a-zA-Z0-9_-]+)",
-            response.text,
-        )  # =s{size}-c-k-c0x00ffffff-no-rj
+    def stale(self, now: float | None = None) -> list[str]:
+        now = time.time() if now is None else now
+        return [
+            channel_id
+            for channel_id, channel_data in self.registry.items()
+            if channel_data.get("link", {}).get("youtube")
+            and (
+                not channel_data.get("avatar_url")
+                or now - self.state.get(channel_id, {}).get("checked_at", 0) >= self.ttl
+            )
+        ]
 
-        if match:
-            return match.group(0).strip()
+    def refresh_one(self, session: requests.Session, channel_id: str) -> None:
+        channel_data = self.registry.data[channel_id]
+        # a missing avatar must not be skipped by a 304
+        state = dict(self.state.get(channel_id, {}))
+        if not channel_data.get("avatar_url"):
+            state.pop("etag", None)
+            state.pop("last_modified", None)
+        try:
+            avatar_url = get_channel_avatar(
+                channel_data["link"]["youtube"], session, state
+            )
+        except requests.RequestException as e:
+            print(f"Unable to access the channel {channel_id}: {e}")
+            return
+        except (KeyError, ValueError, IndexError) as e:
+            # a malformed entry or response must not stop the other channels
+            print(f"Unexpected data for the channel {channel_id}: {e!r}")
+            return
+        with self._lock:
+            state["checked_at"] = int(time.time())
+            self.state[channel_id] = state
+            if avatar_url and avatar_url != channel_data.get("avatar_url"):
+                channel_data["avatar_url"] = avatar_url
+                self.changed += 1
+
+    def refresh(self, force: bool = False) -> int:
+        channel_ids = list(self.registry.data) if force else self.stale()
+        print(f"{len(channel_ids)}/{len(self.registry)} channels to check")
+        with make_session(self.workers) as session:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                futures = [
+                    executor.submit(self.refresh_one, session, channel_id)
+                    for channel_id in channel_ids
+                ]
+                for future in futures:
+                    future.result()
+        return self.changed
+
+    def save(self) -> None:
+        if self.changed:
+            self.registry.save()
+            print(f"Updated {self.changed} avatars in {self.registry.path}")
         else:
-            print("Not found the avatar URL for this channel!")
-            return None
-    else:
-        print(f"Unable to access the channel: {response.status_code}")
-        return None
+            print("No avatar changed, vtuber.json left untouched")
+        with open(self.state_path, mode="w", encoding="utf-8") as file:
+            json.dump(self.state, file, ensure_ascii=False, indent=4, sort_keys=True)
 
 
 if __name__ == "__main__":
-    vtuber_data = {}
-    with open("./vtuber.json", "r", encoding="utf-8") as file:
-        vtuber_data = json.load(file)
-
-    for channel_id, channel_data in vtuber_data.items():
-        channel_url = channel_data.get("link", "").get("youtube")
-        avatar_url = get_channel_avatar(channel_url)
-        channel_data["avatar_url"] = avatar_url
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--force", action="store_true", help="check every channel, ignoring the TTL"
+    )
+    args = parser.parse_args()
 
-    with open("./vtuber.json", "w", encoding="utf-8") as file:
-        json.dump(vtuber_data, file, ensure_ascii=False, indent=4)
+    refresher = AvatarRefresher(ChannelRegistry.load())
+    refresher.refresh(force=args.force)
+    refresher.save()
@@ -1,8 +1,8 @@
-import copy
 import json
-import time
 from pathlib import Path
 
+from channel_registry import get_registry, merge_tracked_channels
+
 LIVE_STEAMS_PATH = Path("./live_streams.json").absolute()
 UPCOMING_STEAMS_PATH = Path("./upcoming.json").absolute()
 IS_TEST = False
@@ -11,52 +11,35 @@ if IS_TEST:
     UPCOMING_STEAMS_PATH = Path("./tests/upcoming_test.json").absolute()
 
 
+def load(path: Path) -> dict:
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
 def run():
+    """
+    Add the channels of vtuber.json missing from the exported snapshots and
+    drop the untracked ones. main.py does the same on state.db at startup.
+    """
     print(">>> Loading data...")
-    vtuber_data = {}
-    data = {}
-    with open("./vtuber.json", "r", encoding="utf-8") as file:
-        vtuber_data = json.load(file)
-
-    for channel_id, channel_data in vtuber_data.items():
-        data[channel_id] = {
-            "channel_url": channel_data.get(
-                "link", "https://www.youtube.com/@notfound"
-            ).get("youtube"),
-            "channel_name": channel_data.get("channel_name", "John Doe Ch."),
-            "avatar_url": channel_data.get(
-                "avatar_url",
-                "https://yt3.googleusercontent.com/U3KyLvyQRzOrgRHZYEYPQCc1QS2Jx5LnQF_5H6aYDluVM8AOnAZ90U0tSY3aVobgVNlRccieDA",
-            ),
-            "videos": [],
-        }
-
-    with open(LIVE_STEAMS_PATH, "r", encoding="utf-8") as file:
-        live_data = json.load(file)
-
-    with open(UPCOMING_STEAMS_PATH, "r", encoding="utf-8") as file:
-        upcoming_data = json.load(file)
-
-    live_streams_result = copy.deepcopy(data)
-    for channel_id, l_data in live_data.items():
-        if l_data.get("videos", []):
-            if channel_id in live_streams_result:
-                live_streams_result[channel_id]["videos"] = l_data.get("videos", [])
-
-    upcoming_result = copy.deepcopy(data)
-    for channel_id, u_data in upcoming_data.items():
-        if u_data.get("videos", []):
-            if channel_id in upcoming_result:
-                upcoming_result[channel_id]["videos"] = u_data.get("videos", [])
-
-    with open(LIVE_STEAMS_PATH, "w", encoding="utf-8") as file:
-        json.dump(live_streams_result, file, ensure_ascii=False, indent=4)
-
-    with open(UPCOMING_STEAMS_PATH, "w", encoding="utf-8") as file:
-        json.dump(upcoming_result, file, ensure_ascii=False, indent=4)
+    live_data = load(LIVE_STEAMS_PATH)
+    upcoming_data = load(UPCOMING_STEAMS_PATH)
+    registry = get_registry()
+
+    for path, data in (
+        (LIVE_STEAMS_PATH, live_data),
+        (UPCOMING_STEAMS_PATH, upcoming_data),
+    ):
+        if merge_tracked_channels(registry, data):
+            with open(path, "w", encoding="utf-8") as file:
+                json.dump(
+                    dict(sorted(data.items())), file, ensure_ascii=False, indent=4
+                )
+            print(f">>> Updated {path.name}")
 
     print(">>> Loaded!")
-    time.sleep(2)
 
 
 if __name__ == "__main__":
@@ -1,38 +1,135 @@
 # ====================== IMPORTS ======================
+import argparse
+import copy
+import heapq
+import io
+import itertools
 import json
 import os
-import shutil
-import smtplib
+import queue
+import random
+import re
 import sqlite3
+import subprocess
+import sys
+import threading
+import xml.etree.ElementTree as ET
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import unicodedata
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
 from hashlib import md5
 from pathlib import Path
-from uuid import uuid4
+from typing import TYPE_CHECKING, NamedTuple
 
-import inflect
-import pytz
-import requests
-import yt_dlp
-from deep_translator import GoogleTranslator
 from dotenv import load_dotenv
 
+from channel_registry import (
+    channel_skeleton,
+    get_registry,
+    merge_tracked_channels,
+    normalize_channel_url,
+)
+from models import (
+    TIMEZONE,
+    Channel,
+    StreamStatus,
+    Video,
+    format_date,
+    snapshot_from_json,
+    snapshot_to_json,
+)
+from render import (
+    LABELS,
+    BlockCache,
+    channel_context,
+    fill_slots,
+    render_channel,
+    render_page,
+    render_summary,
+    video_context,
+    video_slots,
+)
+
+# heavy dependencies are imported where they are used, only for annotations here
+if TYPE_CHECKING:
+    from email.mime.multipart import MIMEMultipart
+
+    import smtplib
+
+    import requests
+    import yt_dlp
+    from deep_translator import GoogleTranslator
+    from yt_dlp.cookies import YoutubeDLCookieJar
+
 # import logging
 load_dotenv()
 from_lang = "auto"
 to_lang = "en"
-translator = GoogleTranslator(source=from_lang, target=to_lang)
+inflect_engine = None
 # ====================== CONSTANTS ======================
 SENDER_EMAIL = os.getenv("SENDER_EMAIL")
 SENDER_PWD = os.getenv("SENDER_PWD")
 RECEIVER_EMAIL = os.getenv("RECEIVER_EMAIL")
 ENV = os.getenv("ENV") or "production"
 DISCORD_WEBHOOK_URL = os.getenv("DISCORD_WEBHOOK_URL")
+STREAM_NOTIFY = (os.getenv("STREAM_NOTIFY") or "0") == "1"
+DISCORD_EMBEDS = (os.getenv("DISCORD_EMBEDS") or "0") == "1"
+DISCORD_MAX_LENGTH = 2000  # characters per message, 4096 per embed description
+DISCORD_RETRIES = 5
+SMTP_HOST = os.getenv("SMTP_HOST") or "smtp.gmail.com"
+SMTP_PORT = int(os.getenv("SMTP_PORT") or 587)
+SMTP_TLS = os.getenv("SMTP_TLS") or "starttls"  # starttls | ssl | none
+SMTP_TIMEOUT = 30  # seconds
+SMTP_RETRIES = 3
+SMTP_KEEPALIVE = 60  # seconds idle before the session is checked with NOOP
 LIMIT = 15  # minutes
 DB_PATH = "titles.db"
+TITLE_CACHE_SIZE = 2048  # titles kept in memory in front of titles.db
+TRANSLATE_TITLES = (os.getenv("TRANSLATE_TITLES") or "1") == "1"
+TRANSLATE_BATCH_SIZE = 10
+TRANSLATE_WORKERS = 4
+TRANSLATE_BUDGET = 60  # seconds for the whole translation stage
+TRANSLATE_RETRIES = 3
+TRANSLATE_ERROR = "Error 500 (Server Error)!!1500.That’s an error.There was an error. Please try again later.That’s all we know."
+COOKIES_PATH = "cookies.txt"
+# /streams entries requested from yt-dlp, upcoming and live streams are always
+# at the top of the tab; 0 extracts the whole tab
+STREAMS_MAX_ITEMS = int(os.getenv("STREAMS_MAX_ITEMS") or 15)
+FETCH_MODE = os.getenv("FETCH_MODE") or "thread"  # thread | async
+FETCH_CONCURRENCY = int(os.getenv("FETCH_CONCURRENCY") or 20)
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS") or 2)
+PROBE_CHANNELS = (os.getenv("PROBE_CHANNELS") or "1") == "1"
+# fetch governor: token bucket shared by every worker, halved on throttling
+FETCH_RATE = float(os.getenv("FETCH_RATE") or 3)  # extractions per second
+FETCH_BURST = int(os.getenv("FETCH_BURST") or 10)
+FETCH_RETRIES = int(os.getenv("FETCH_RETRIES") or 1)
+FETCH_BACKOFF = float(os.getenv("FETCH_BACKOFF") or 5)  # seconds, doubled per retry
+FETCH_THROTTLE_PAUSE = 30  # seconds without any request after a 429 / bot check
+FETCH_BREAKER_THRESHOLD = int(os.getenv("FETCH_BREAKER_THRESHOLD") or 3)
+FETCH_BREAKER_COOLDOWN = int(os.getenv("FETCH_BREAKER_COOLDOWN") or 60 * 60)
+FETCH_BREAKER_MAX_COOLDOWN = 24 * 60 * 60
+PROBE_STATE_PATH = "probe_state.json"  # legacy, imported into state.db
+PROBE_MAX_AGE = 6 * 60 * 60  # seconds, force a full extraction after this
+FEED_URL = "https://www.youtube.com/feeds/videos.xml?channel_id={}"
+HASH_STATE_PATH = "hashes.json"  # legacy, imported into / exported from state.db
+STATE_DB_PATH = "state.db"
+SHARD_DIR = "shards"  # partial snapshots of --shard runs, consumed by --merge
+RUN_REPORT_PATH = "run_report.json"
+METRICS_PATH = "metrics.prom"  # Prometheus textfile collector format
+# fields left out of the content hashes, changing them alone does not resend
+HASH_EXCLUDE_FIELDS = set(
+    (os.getenv("HASH_EXCLUDE_FIELDS") or "thumbnail,description,avatar_url").split(",")
+)
+DAEMON_INTERVALS = {  # seconds between two polls of a channel
+    "soon": 60,  # upcoming stream inside the LIMIT window
+    "live": 2 * 60,
+    "upcoming": 10 * 60,
+    "idle": 30 * 60,
+}
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"
 
 ENV_LIST = {
     "production": "AUTO",
@@ -84,6 +181,8 @@ FILTERS = {
         "color": "#FF4500",
         "is_true": False,
         "filter": UNARCHIVE_FILTERS,
+        "word_boundary": False,
+        "normalize": True,
         "label": '<span style="font-weight: bold; background-color: palevioletred; padding: 1.5px; margin: 4px; border-style: dashed;">UNARCHIVED</span>',
     },
     "Karaoke": {
@@ -92,6 +191,8 @@ FILTERS = {
         "color": "#32CD32",
         "is_true": False,
         "filter": KARAOKE_FILTERS,
+        "word_boundary": True,  # "sing" must not match "closing"
+        "normalize": True,
         "label": '<span style="font-weight: bold; background-color: burlywood; padding: 1.5px; margin: 4px; border-style: dashed;">Karaoke</span>',
     },
     "Test": {
@@ -100,6 +201,8 @@ FILTERS = {
         "color": "#6D41BF",
         "is_true": False,
         "filter": TEST_FILTERS,
+        "word_boundary": True,  # "test" must not match "contest"
+        "normalize": True,
         "label": '<span style="font-weight: bold; background-color: burlywood; padding: 1.5px; margin: 4px; border-style: dashed;">Test</span>',
     },
     # "Liar's Bar": {
@@ -136,6 +239,1619 @@ class Color:
     RESET = "\033[0m"
 
 
+class EventKind:
+    ADDED = "added"
+    REMOVED = "removed"
+    WENT_LIVE = "went_live"
+    RESCHEDULED = "rescheduled"
+    TITLE_CHANGED = "title_changed"
+
+
+class StreamEvent(NamedTuple):
+    kind: str
+    channel_id: str
+    video_id: str
+    status: StreamStatus  # current status (previous one for REMOVED)
+    video: Video
+    previous: Video | None = None
+
+
+class FilterMatcher:
+    """
+    Every keyword list of FILTERS compiled once into a single trie-shaped
+    regex (one per normalization mode), so a text is scanned once for all
+    categories. Results are cached by video_id.
+
+    Per category: "word_boundary" only accepts latin keywords that are not
+    surrounded by ASCII letters or digits, so "test" does not match "contest"
+    but still matches "test配信" (CJK has no word boundaries). "normalize"
+    applies NFKC + casefold to the text and keywords instead of lower().
+    """
+
+    CACHE_SIZE = 10000
+    # only ASCII letters and digits continue a latin word, str.isalnum() is
+    # also true for kana and kanji
+    WORD_BEFORE = r"(?<![A-Za-z0-9])"
+    WORD_AFTER = r"(?![A-Za-z0-9])"
+
+    def __init__(self, filters: dict):
+        self._patterns = []  # (normalize, compiled regex, keyword -> rules)
+        self._cache = {}
+        self._lock = threading.Lock()
+        by_mode = {}
+        for category, config in filters.items():
+            normalize = config.get("normalize", False)
+            rules = by_mode.setdefault(normalize, {})
+            for keyword in config.get("filter", []):
+                keyword = self.prepare(keyword, normalize)
+                boundary = bool(config.get("word_boundary")) and keyword.isascii()
+                rules.setdefault(keyword, []).append((category, boundary))
+        for normalize, rules in by_mode.items():
+            words = [
+                keyword
+                for keyword, keyword_rules in rules.items()
+                if any(boundary for _, boundary in keyword_rules)
+            ]
+            substrings = [
+                keyword
+                for keyword, keyword_rules in rules.items()
+                if not all(boundary for _, boundary in keyword_rules)
+            ]
+            branches = []
+            if words:
+                branches.append(
+                    f"{self.WORD_BEFORE}(?P<word>{self.trie_pattern(words)}){self.WORD_AFTER}"
+                )
+            if substrings:
+                branches.append(f"(?P<substring>{self.trie_pattern(substrings)})")
+            if not branches:
+                continue
+            # a lookahead on the first characters lets re skip positions
+            # quickly, the lookbehind of the word branch would defeat that
+            first = "".join(sorted({keyword[0] for keyword in rules}))
+            pattern = re.compile(f"(?=[{re.escape(first)}])(?:{'|'.join(branches)})")
+            self._patterns.append((normalize, pattern, rules))
+
+    @staticmethod
+    def trie_pattern(keywords) -> str:
+        """Regex of a keyword trie: shared prefixes are only tried once."""
+        trie = {}
+        for keyword in keywords:
+            node = trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[""] = {}
+
+        def build(node: dict) -> str:
+            branches = [
+                re.escape(char) + build(child)
+                for char, child in sorted(node.items())
+                if char
+            ]
+            if not branches:
+                return ""
+            pattern = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+            return f"(?:{pattern})?" if "" in node else pattern
+
+        return build(trie)
+
+    @staticmethod
+    def prepare(text: str, normalize: bool) -> str:
+        if normalize and not text.isascii():
+            return unicodedata.normalize("NFKC", text).casefold()
+        return text.lower()
+
+    def match(self, title: str = "", description: str = "") -> frozenset[str]:
+        """Every category matching the title or the description."""
+        text = f"{title or ''}\n{description or ''}"
+        categories = set()
+        for normalize, pattern, rules in self._patterns:
+            prepared = self.prepare(text, normalize)
+            for found in pattern.finditer(prepared):
+                # the word branch is tried first; a keyword found by the
+                # substring branch only counts for categories without
+                # word_boundary
+                is_word = found.lastgroup == "word"
+                for category, boundary in rules[found.group()]:
+                    if is_word or not boundary:
+                        categories.add(category)
+        return frozenset(categories)
+
+    def match_video(self, video: Video) -> frozenset[str]:
+        key = video.video_id
+        text = (video.title, video.description)
+        with self._lock:
+            cached = self._cache.get(key)
+        if cached is not None and cached[0] == text:
+            return cached[1]
+        categories = self.match(*text)
+        with self._lock:
+            if len(self._cache) >= self.CACHE_SIZE:
+                self._cache.clear()
+            self._cache[key] = (text, categories)
+        return categories
+
+
+class HashStore:
+    """
+    Per-channel and per-video content hashes of the last notified snapshots
+    (replaces prev_hash_upcoming.md5/prev_hash_live.md5). Persisted in the
+    hashes table of state.db together with the run snapshots.
+    """
+
+    def __init__(self, state: dict | None = None):
+        self.state = state or {}
+        self.changed = {}  # kind -> channel ids changed in this run
+
+    def run_hash(self, kind: str) -> str:
+        return combine_hashes(self.state.get(kind, {}))
+
+    def diff(self, kind: str, channel_hashes: dict) -> set[str]:
+        """Channel ids whose hash differs from the stored one (or were removed)."""
+        previous = self.state.get(kind, {})
+        changed = {
+            channel_id
+            for channel_id, hashes in channel_hashes.items()
+            if previous.get(channel_id, {}).get("hash") != hashes["hash"]
+        }
+        changed |= previous.keys() - channel_hashes.keys()
+        self.changed[kind] = changed
+        return changed
+
+    def update(self, kind: str, channel_hashes: dict) -> None:
+        self.state[kind] = channel_hashes
+
+
+class StateStore:
+    """
+    State between runs in one SQLite file (state.db): channels, videos with
+    their status transitions, notification hashes, urgent notifications
+    already sent, RSS probe validators and run history. Reading the previous
+    snapshot is an indexed query and each run is written in a single
+    transaction. export() still writes the legacy JSON files.
+    """
+
+    SNAPSHOT_FILES = {
+        StreamStatus.UPCOMING: "upcoming.json",
+        StreamStatus.LIVE: "live_streams.json",
+    }
+    PROBE_FIELDS = ("channel_id", "extracted_at", "digest", "etag", "last_modified")
+
+    def __init__(self, path: str = STATE_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS channels (
+                channel_id TEXT PRIMARY KEY,
+                channel_url TEXT,
+                channel_name TEXT,
+                avatar_url TEXT,
+                in_upcoming INTEGER NOT NULL DEFAULT 0,
+                in_live INTEGER NOT NULL DEFAULT 0,
+                updated_at INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS videos (
+                video_id TEXT PRIMARY KEY,
+                channel_id TEXT NOT NULL,
+                status TEXT NOT NULL,
+                data TEXT NOT NULL,
+                first_seen INTEGER,
+                updated_at INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS videos_status ON videos (status, channel_id);
+            CREATE TABLE IF NOT EXISTS transitions (
+                video_id TEXT NOT NULL,
+                old_status TEXT,
+                new_status TEXT NOT NULL,
+                at INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS transitions_video ON transitions (video_id);
+            CREATE TABLE IF NOT EXISTS hashes (
+                kind TEXT NOT NULL,
+                channel_id TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                videos TEXT NOT NULL,
+                PRIMARY KEY (kind, channel_id)
+            );
+            CREATE TABLE IF NOT EXISTS channel_health (
+                channel_url TEXT PRIMARY KEY,
+                failures INTEGER NOT NULL,
+                open_until REAL NOT NULL,
+                last_error TEXT,
+                updated_at INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS probe (
+                channel_url TEXT PRIMARY KEY,
+                channel_id TEXT,
+                extracted_at INTEGER,
+                digest TEXT,
+                etag TEXT,
+                last_modified TEXT
+            );
+            CREATE TABLE IF NOT EXISTS notified (
+                video_id TEXT NOT NULL,
+                reason TEXT NOT NULL,
+                at INTEGER NOT NULL,
+                PRIMARY KEY (video_id, reason)
+            );
+            CREATE TABLE IF NOT EXISTS runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                started_at TEXT NOT NULL,
+                seconds REAL NOT NULL,
+                channels INTEGER,
+                upcoming INTEGER,
+                live INTEGER
+            );
+        """)
+        self.conn.commit()
+        if not self.conn.execute("SELECT 1 FROM channels LIMIT 1").fetchone():
+            self.import_json()
+        if not self.conn.execute("SELECT 1 FROM probe LIMIT 1").fetchone():
+            self.import_probe()
+
+    def import_json(self, directory: str = ".") -> None:
+        """One-time migration from upcoming.json/live_streams.json/hashes.json."""
+        upcoming, live_streams = (
+            snapshot_from_json(load_snapshot(Path(directory, name)), status)
+            for status, name in self.SNAPSHOT_FILES.items()
+        )
+        if not upcoming and not live_streams:
+            return
+        hashes = {}
+        hash_path = Path(directory, HASH_STATE_PATH)
+        if hash_path.exists():
+            content = hash_path.read_text(encoding="utf-8").strip()
+            hashes = json.loads(content) if content else {}
+        self.save_run(upcoming, live_streams, hashes)
+        print_text(f"Imported the JSON snapshots into {self.path}", "S")
+
+    def import_probe(self, path: str = PROBE_STATE_PATH) -> None:
+        """One-time migration of probe_state.json."""
+        if not Path(path).exists():
+            return
+        with open(path, mode="r", encoding="utf-8") as file:
+            probe = json.load(file)
+        self.save_probe(probe)
+        print_text(f"Imported {path} into {self.path}", "S")
+
+    def snapshot(self, status: StreamStatus) -> dict[str, Channel]:
+        """channel_id -> Channel of one status, what upcoming.json holds."""
+        snapshot = {}
+        with self._lock:
+            rows = self.conn.execute(
+                f"""
+                SELECT c.channel_id, c.channel_url, c.channel_name, c.avatar_url, v.data
+                FROM channels c
+                LEFT JOIN videos v ON v.channel_id = c.channel_id AND v.status = ?
+                WHERE c.in_{status} = 1
+                ORDER BY c.channel_id, v.video_id
+            """,
+                (status,),
+            ).fetchall()
+        for channel_id, channel_url, channel_name, avatar_url, data in rows:
+            channel = snapshot.get(channel_id)
+            if channel is None:
+                channel = snapshot[channel_id] = Channel(
+                    channel_url, channel_name, avatar_url
+                )
+            if data is not None:
+                channel.videos.append(Video.from_dict(json.loads(data), status))
+        return snapshot
+
+    def hashes(self) -> dict:
+        state = {}
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT kind, channel_id, hash, videos FROM hashes"
+            )
+            for kind, channel_id, hash_, videos in rows:
+                state.setdefault(kind, {})[channel_id] = {
+                    "hash": hash_,
+                    "videos": json.loads(videos),
+                }
+        return state
+
+    def health(self) -> dict:
+        """channel_url -> failure state of the channels that failed last."""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT channel_url, failures, open_until, last_error FROM channel_health"
+            ).fetchall()
+        return {
+            channel_url: {
+                "failures": failures,
+                "open_until": open_until,
+                "last_error": last_error,
+            }
+            for channel_url, failures, open_until, last_error in rows
+        }
+
+    def probe(self) -> dict:
+        """channel_url -> validators and last extraction of the RSS probe."""
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT channel_url, {', '.join(self.PROBE_FIELDS)} FROM probe"
+            ).fetchall()
+        return {
+            channel_url: dict(zip(self.PROBE_FIELDS, values))
+            for channel_url, *values in rows
+        }
+
+    def save_probe(self, probe: dict) -> None:
+        with self._lock, self.conn:
+            self._write_probe(probe)
+
+    def _write_probe(self, probe: dict) -> None:
+        # upsert only: a sharded run writes the channels of its shards
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO probe VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                (channel_url, *(entry.get(field) for field in self.PROBE_FIELDS))
+                for channel_url, entry in probe.items()
+            ),
+        )
+
+    def is_first_run(self) -> bool:
+        """
+        Nothing to compare a run with yet: no run recorded and no video ever
+        seen. An empty snapshot alone is normal for a quiet roster.
+        """
+        with self._lock:
+            return not (
+                self.conn.execute("SELECT 1 FROM runs LIMIT 1").fetchone()
+                or self.conn.execute("SELECT 1 FROM videos LIMIT 1").fetchone()
+            )
+
+    def notified(self) -> set[tuple[str, str]]:
+        """(video_id, reason) of the urgent notifications already sent."""
+        with self._lock:
+            return set(self.conn.execute("SELECT video_id, reason FROM notified"))
+
+    def mark_notified(self, keys) -> None:
+        now = int(time.time())
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO notified VALUES (?, ?, ?)",
+                ((video_id, reason, now) for video_id, reason in keys),
+            )
+
+    def save_run(
+        self,
+        upcoming: dict,
+        live_streams: dict,
+        hashes: dict | None = None,
+        run: dict | None = None,
+        health: dict | None = None,
+        probe: dict | None = None,
+    ) -> None:
+        """
+        Write the snapshots, hashes, channel health, probe validators and run
+        record in one transaction.
+        """
+        now = int(time.time())
+        with self._lock, self.conn:
+            previous = dict(
+                self.conn.execute(
+                    "SELECT video_id, status FROM videos WHERE status != 'ended'"
+                )
+            )
+            self.conn.execute("UPDATE channels SET in_upcoming = 0, in_live = 0")
+            channels = {}
+            videos = []
+            for status, snapshot in (
+                (StreamStatus.UPCOMING, upcoming),
+                (StreamStatus.LIVE, live_streams),
+            ):
+                for channel_id, info in snapshot.items():
+                    channel = channels.setdefault(
+                        channel_id,
+                        [
+                            channel_id,
+                            info.channel_url,
+                            info.channel_name,
+                            info.avatar_url,
+                            0,
+                            0,
+                            now,
+                        ],
+                    )
+                    channel[4 if status == StreamStatus.UPCOMING else 5] = 1
+                    for video in info.videos:
+                        videos.append(
+                            (
+                                video.video_id,
+                                channel_id,
+                                status,
+                                json.dumps(video.to_dict(), ensure_ascii=False),
+                                now,
+                                now,
+                            )
+                        )
+            self.conn.executemany(
+                """
+                INSERT INTO channels VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (channel_id) DO UPDATE SET
+                    channel_url = excluded.channel_url,
+                    channel_name = excluded.channel_name,
+                    avatar_url = excluded.avatar_url,
+                    in_upcoming = excluded.in_upcoming,
+                    in_live = excluded.in_live,
+                    updated_at = excluded.updated_at
+            """,
+                channels.values(),
+            )
+            self.conn.executemany(
+                """
+                INSERT INTO videos VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (video_id) DO UPDATE SET
+                    channel_id = excluded.channel_id,
+                    status = excluded.status,
+                    data = excluded.data,
+                    updated_at = excluded.updated_at
+            """,
+                videos,
+            )
+
+            current = {video[0]: video[2] for video in videos}
+            transitions = [
+                (video_id, previous.get(video_id), status, now)
+                for video_id, status in current.items()
+                if previous.get(video_id) != status
+            ]
+            ended = previous.keys() - current.keys()
+            transitions += [
+                (video_id, previous[video_id], "ended", now) for video_id in ended
+            ]
+            self.conn.executemany(
+                "UPDATE videos SET status = 'ended', updated_at = ? WHERE video_id = ?",
+                ((now, video_id) for video_id in ended),
+            )
+            self.conn.executemany(
+                "INSERT INTO transitions VALUES (?, ?, ?, ?)", transitions
+            )
+
+            if hashes is not None:
+                self.conn.execute("DELETE FROM hashes")
+                self.conn.executemany(
+                    "INSERT INTO hashes VALUES (?, ?, ?, ?)",
+                    (
+                        (kind, channel_id, value["hash"], json.dumps(value["videos"]))
+                        for kind, channel_hashes in hashes.items()
+                        for channel_id, value in channel_hashes.items()
+                    ),
+                )
+            if health is not None:
+                self.conn.execute("DELETE FROM channel_health")
+                self.conn.executemany(
+                    "INSERT INTO channel_health VALUES (?, ?, ?, ?, ?)",
+                    (
+                        (
+                            channel_url,
+                            value["failures"],
+                            value["open_until"],
+                            value["last_error"],
+                            now,
+                        )
+                        for channel_url, value in health.items()
+                    ),
+                )
+            if probe is not None:
+                self._write_probe(probe)
+            if run is not None:
+                self._insert_run(run)
+
+    def _insert_run(self, run: dict) -> None:
+        self.conn.execute(
+            """
+            INSERT INTO runs (started_at, seconds, channels, upcoming, live)
+            VALUES (:started_at, :seconds, :channels, :upcoming, :live)
+        """,
+            run,
+        )
+
+    def record_run(self, run: dict) -> None:
+        """Run record of a run whose snapshots did not change."""
+        with self._lock, self.conn:
+            self._insert_run(run)
+
+    def export(self, directory: str = ".") -> None:
+        """Write upcoming.json, live_streams.json, hashes.json and time-run.txt."""
+        Path(directory).mkdir(parents=True, exist_ok=True)
+        for status, name in self.SNAPSHOT_FILES.items():
+            with open(Path(directory, name), mode="w", encoding="utf-8") as file:
+                json.dump(
+                    snapshot_to_json(self.snapshot(status)),
+                    file,
+                    ensure_ascii=False,
+                    indent=4,
+                )
+        with open(Path(directory, HASH_STATE_PATH), mode="w", encoding="utf-8") as file:
+            json.dump(self.hashes(), file, ensure_ascii=False, indent=4, sort_keys=True)
+        with self._lock:
+            runs = self.conn.execute(
+                "SELECT started_at, seconds FROM runs ORDER BY id"
+            ).fetchall()
+        with open(Path(directory, "time-run.txt"), mode="w", encoding="utf-8") as file:
+            for started_at, seconds in runs:
+                file.write(
+                    f"{started_at} ::: Script ran {pretty_time_delta(timedelta(seconds=seconds))} ({seconds} seconds)\n"
+                )
+        print_text(f"Exported {self.path} to {Path(directory).resolve()}", "S")
+
+    def clean_up(self, days: int = 7) -> None:
+        """Forget videos that ended more than `days` ago."""
+        threshold = int(time.time()) - days * 24 * 60 * 60
+        with self._lock, self.conn:
+            self.conn.execute(
+                "DELETE FROM transitions WHERE video_id IN (SELECT video_id FROM videos WHERE status = 'ended' AND updated_at < ?)",
+                (threshold,),
+            )
+            self.conn.execute(
+                "DELETE FROM videos WHERE status = 'ended' AND updated_at < ?",
+                (threshold,),
+            )
+            self.conn.execute("DELETE FROM notified WHERE at < ?", (threshold,))
+
+    def close(self) -> None:
+        with self._lock:
+            # fold the WAL back in: the workflow commits the .db file alone
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self.conn.close()
+
+
+class RunMetrics:
+    """
+    Timings of one run: seconds and calls per stage, one fetch record per
+    channel (with its error) and the fetch pool queue depth / utilization.
+    Written as a Prometheus textfile and a JSON run report.
+    """
+
+    def __init__(self):
+        self.started_at = datetime.now(TIMEZONE)
+        self.start = time.monotonic()
+        self.stages = {}  # name -> [seconds, calls]
+        self.channels = {}  # channel_url -> {"seconds", "ok", "error"}
+        self.fetch = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                totals = self.stages.setdefault(name, [0.0, 0])
+                totals[0] += elapsed
+                totals[1] += 1
+
+    def channel(
+        self,
+        channel_url: str,
+        seconds: float,
+        ok: bool,
+        error: str | None = None,
+        bytes_: int | None = None,
+    ) -> None:
+        with self._lock:
+            self.channels[channel_url] = {
+                "seconds": round(seconds, 4),
+                "ok": ok,
+                "error": error,
+                "bytes": bytes_,
+            }
+
+    def fetch_pool(
+        self, workers: int, wall: float, busy: float, queue_depths: list[int]
+    ) -> None:
+        with self._lock:
+            self.fetch = {
+                "workers": workers,
+                "seconds": round(wall, 4),
+                "utilization": round(busy / (workers * wall), 4) if wall else 0.0,
+                "queue_depth_max": max(queue_depths, default=0),
+                "queue_depth_mean": (
+                    round(sum(queue_depths) / len(queue_depths), 2)
+                    if queue_depths
+                    else 0.0
+                ),
+            }
+
+    def report(self) -> dict:
+        with self._lock:
+            channels = sorted(
+                self.channels.items(), key=lambda item: item[1]["seconds"], reverse=True
+            )
+            return {
+                "started_at": self.started_at.strftime("%Y/%m/%d %H:%M:%S"),
+                "seconds": round(time.monotonic() - self.start, 4),
+                "stages": {
+                    name: {"seconds": round(seconds, 4), "calls": calls}
+                    for name, (seconds, calls) in self.stages.items()
+                },
+                "fetch": {
+                    **self.fetch,
+                    "channels": len(channels),
+                    "failed": sum(not info["ok"] for _, info in channels),
+                    "bytes": sum(info["bytes"] or 0 for _, info in channels),
+                },
+                "channels": [{"url": url, **info} for url, info in channels],
+            }
+
+    @staticmethod
+    def _label(value: str) -> str:
+        return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    def prometheus(self) -> str:
+        report = self.report()
+        lines = []
+
+        def metric(name, help_, samples):
+            lines.append(f"# HELP checklive_{name} {help_}")
+            lines.append(f"# TYPE checklive_{name} gauge")
+            for labels, value in samples:
+                lines.append(f"checklive_{name}{labels} {value}")
+
+        metric("run_seconds", "Duration of the last run.", [("", report["seconds"])])
+        metric(
+            "run_timestamp_seconds",
+            "Start of the last run.",
+            [("", int(self.started_at.timestamp()))],
+        )
+        metric(
+            "stage_seconds",
+            "Seconds spent per stage in the last run.",
+            [
+                (f'{{stage="{self._label(name)}"}}', stage["seconds"])
+                for name, stage in report["stages"].items()
+            ],
+        )
+        metric(
+            "stage_calls",
+            "Calls per stage in the last run.",
+            [
+                (f'{{stage="{self._label(name)}"}}', stage["calls"])
+                for name, stage in report["stages"].items()
+            ],
+        )
+        for key in (
+            "workers",
+            "utilization",
+            "queue_depth_max",
+            "queue_depth_mean",
+            "bytes",
+        ):
+            if key in report["fetch"]:
+                metric(
+                    f"fetch_{key}", f"Fetch pool {key}.", [("", report["fetch"][key])]
+                )
+        metric(
+            "channel_fetch_seconds",
+            "Fetch duration per channel.",
+            [
+                (f'{{channel="{self._label(info["url"])}"}}', info["seconds"])
+                for info in report["channels"]
+            ],
+        )
+        metric(
+            "channel_fetch_bytes",
+            "Bytes downloaded per channel.",
+            [
+                (f'{{channel="{self._label(info["url"])}"}}', info["bytes"])
+                for info in report["channels"]
+                if info["bytes"] is not None
+            ],
+        )
+        metric(
+            "channel_fetch_success",
+            "1 when the channel was fetched, 0 when it failed.",
+            [
+                (f'{{channel="{self._label(info["url"])}"}}', int(info["ok"]))
+                for info in report["channels"]
+            ],
+        )
+        return "\n".join(lines) + "\n"
+
+    def write(
+        self, report_path: str = RUN_REPORT_PATH, metrics_path: str = METRICS_PATH
+    ) -> None:
+        with open(report_path, mode="w", encoding="utf-8") as file:
+            json.dump(self.report(), file, ensure_ascii=False, indent=2)
+        # write then rename, node_exporter must never read a partial textfile
+        tmp_path = f"{metrics_path}.tmp"
+        with open(tmp_path, mode="w", encoding="utf-8") as file:
+            file.write(self.prometheus())
+        os.replace(tmp_path, metrics_path)
+        print_text(f"Wrote {report_path} and {metrics_path}", "S")
+
+    def summary(self) -> str:
+        report = self.report()
+        stages = ", ".join(
+            f"{name} {stage['seconds']:.2f}s"
+            for name, stage in report["stages"].items()
+        )
+        slowest = ", ".join(
+            f"{info['url'].rsplit('/', 1)[-1]} {info['seconds']:.1f}s"
+            for info in report["channels"][:3]
+        )
+        return f"Stages: {stages} | failed channels: {report['fetch']['failed']} | downloaded: {report['fetch']['bytes'] / 2**20:.1f} MiB | slowest: {slowest}"
+
+
+class CookieStore:
+    """Netscape cookie jar parsed once per run and shared by every worker."""
+
+    def __init__(self, jar: "YoutubeDLCookieJar", path: str | None = None):
+        self.jar = jar
+        self.path = path
+        self.changed = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str = COOKIES_PATH) -> "CookieStore":
+        # cookies.txt is written by create_cookies_file.py, fall back to the
+        # raw secret when the file was not created
+        from yt_dlp.cookies import YoutubeDLCookieJar
+
+        jar = YoutubeDLCookieJar()
+        if Path(path).exists():
+            jar.load(path)
+            return cls(jar, path)
+        cookies_content = os.getenv("COOKIES_CONTENT")
+        if cookies_content:
+            jar.load(io.StringIO(cookies_content))
+        else:
+            print_text(f"No cookies found in {path} or COOKIES_CONTENT!", "W")
+        return cls(jar)
+
+    def clone_into(self, jar: "YoutubeDLCookieJar") -> None:
+        """Copy every cookie into a worker jar, the shared jar stays untouched."""
+        with self._lock:
+            cookies = [copy.copy(cookie) for cookie in self.jar]
+        for cookie in cookies:
+            jar.set_cookie(cookie)
+
+    @staticmethod
+    def is_newer(old, cookie) -> bool:
+        """
+        True when the shared cookie outlives the worker's one. Session cookies
+        (no expiry) cannot be compared, the worker's value wins.
+        """
+        if old.expires is None or cookie.expires is None:
+            return False
+        return old.expires > cookie.expires
+
+    def merge(self, jars: list["YoutubeDLCookieJar"]) -> int:
+        """Merge cookies refreshed by the workers back into the shared jar."""
+        changed = 0
+        with self._lock:
+            known = {
+                (cookie.domain, cookie.path, cookie.name): cookie for cookie in self.jar
+            }
+            for jar in jars:
+                for cookie in jar:
+                    key = (cookie.domain, cookie.path, cookie.name)
+                    old = known.get(key)
+                    if old is not None and (
+                        old.value == cookie.value or self.is_newer(old, cookie)
+                    ):
+                        continue
+                    self.jar.set_cookie(cookie)
+                    known[key] = cookie
+                    changed += 1
+            self.changed += changed
+        return changed
+
+    def header(self, domain: str = "youtube.com") -> str:
+        """Cookie header value for plain HTTP clients (async fetch mode)."""
+        with self._lock:
+            return "; ".join(
+                f"{cookie.name}={cookie.value}"
+                for cookie in self.jar
+                if cookie.domain.lstrip(".").endswith(domain)
+            )
+
+    def save(self) -> None:
+        if self.path is None or not self.changed:
+            return
+        with self._lock:
+            self.jar.save(self.path)
+            self.changed = 0
+        print_text(f"Saved refreshed cookies in to {self.path}", "S")
+
+
+class YoutubeDLPool:
+    """Keep one long-lived YoutubeDL per worker thread for the whole run."""
+
+    def __init__(self, opts: dict, cookies: CookieStore | None = None):
+        self.opts = opts
+        self.cookies = cookies
+        self.created = 0
+        self.reused = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._instances = []
+
+    def get(self) -> "yt_dlp.YoutubeDL":
+        ydl = getattr(self._local, "ydl", None)
+        if ydl is not None:
+            with self._lock:
+                self.reused += 1
+            return ydl
+
+        import yt_dlp
+
+        # no cookiefile: each worker gets an in-memory copy of the shared jar
+        ydl = yt_dlp.YoutubeDL(self.opts)
+        if self.cookies is not None:
+            self.cookies.clone_into(ydl.cookiejar)
+        self.count_bytes(ydl)
+        self._local.ydl = ydl
+        with self._lock:
+            self.created += 1
+            self._instances.append(ydl)
+        return ydl
+
+    def close(self) -> None:
+        with self._lock:
+            instances, self._instances = self._instances, []
+        for ydl in instances:
+            try:
+                ydl.close()
+            except Exception as e:
+                print_text(f"Failed to close YoutubeDL: {e}", "W")
+        if self.cookies is not None and instances:
+            changed = self.cookies.merge([ydl.cookiejar for ydl in instances])
+            print_text(f"Merged {changed} refreshed cookies")
+        self._local = threading.local()
+
+    @staticmethod
+    def count_bytes(ydl: "yt_dlp.YoutubeDL") -> None:
+        """Count the response bytes read by this instance in ydl.downloaded_bytes."""
+        ydl.downloaded_bytes = 0
+        urlopen = ydl.urlopen
+
+        def counting_urlopen(req):
+            response = urlopen(req)
+            read = response.read
+
+            def counting_read(*args, **kwargs):
+                data = read(*args, **kwargs)
+                ydl.downloaded_bytes += len(data)
+                return data
+
+            response.read = counting_read
+            return response
+
+        ydl.urlopen = counting_urlopen
+
+    def stats(self) -> str:
+        return f"YoutubeDL instances: {self.created} created, {self.reused} reused"
+
+
+class FetchGovernor:
+    """
+    Pacing and failure handling of the channel extractions. Every worker
+    takes a token from one bucket; a 429 or a bot check anywhere halves the
+    rate and pauses the bucket, successes slowly bring it back. A channel
+    failing FETCH_BREAKER_THRESHOLD runs in a row is skipped for a cooldown
+    that doubles each time it fails again. Failed and skipped channels are
+    "unknown": their previous state is carried forward.
+    """
+
+    THROTTLE_PATTERN = re.compile(
+        r"\b429\b|too many requests|not a bot|rate.?limit", re.IGNORECASE
+    )
+
+    def __init__(
+        self,
+        health: dict | None = None,
+        rate: float = FETCH_RATE,
+        burst: int = FETCH_BURST,
+    ):
+        self.health = health or {}  # channel_url -> failures, open_until, last_error
+        self.max_rate = rate
+        self.min_rate = rate / 16
+        self.rate = rate
+        self.burst = burst
+        self.unknown = {}  # channel_url -> reason, for this run
+        self.throttled = 0
+        self._tat = 0.0  # theoretical arrival time of the next token
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take a token, returns how long to wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            interval = 1 / self.rate
+            tat = max(self._tat, now, self._paused_until)
+            wait = max(0.0, tat - (self.burst - 1) * interval - now)
+            wait = max(wait, self._paused_until - now)
+            self._tat = tat + interval
+            return wait
+
+    def acquire(self) -> None:
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    @classmethod
+    def is_throttle(cls, error: Exception | str) -> bool:
+        return bool(cls.THROTTLE_PATTERN.search(str(error)))
+
+    def observe(self, error: Exception | str) -> bool:
+        """Slow everyone down when an error is a throttle, returns whether it was."""
+        if not self.is_throttle(error):
+            return False
+        with self._lock:
+            self.throttled += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._paused_until = time.monotonic() + FETCH_THROTTLE_PAUSE
+        print_text(
+            f"Throttled by YouTube, pausing {FETCH_THROTTLE_PAUSE}s at {self.rate:.2f} req/s",
+            "W",
+        )
+        return True
+
+    @staticmethod
+    def backoff(attempt: int) -> float:
+        """Seconds before retry `attempt` of a channel, with jitter."""
+        return FETCH_BACKOFF * 2**attempt * random.uniform(1.0, 1.5)
+
+    def next_attempt(self, channel_url: str) -> float:
+        """Epoch time from which the channel may be fetched again."""
+        with self._lock:
+            return self.health.get(channel_url, {}).get("open_until", 0.0)
+
+    def allow(self, channel_url: str) -> bool:
+        """False while the circuit of the channel is open (it becomes unknown)."""
+        open_until = self.next_attempt(channel_url)
+        if time.time() >= open_until:
+            return True  # closed, or half-open: one try after the cooldown
+        with self._lock:
+            self.unknown[channel_url] = "circuit open"
+        return False
+
+    def success(self, channel_url: str) -> None:
+        with self._lock:
+            self.health.pop(channel_url, None)
+            self.unknown.pop(channel_url, None)
+            # additive increase back to the configured rate
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+    def failure(self, channel_url: str, error: Exception | str) -> None:
+        with self._lock:
+            self.unknown[channel_url] = str(error)
+            if self.is_throttle(error):
+                return  # throttling is not the channel's fault
+            entry = self.health.setdefault(
+                channel_url, {"failures": 0, "open_until": 0.0, "last_error": None}
+            )
+            entry["failures"] += 1
+            entry["last_error"] = str(error)[:500]
+            extra = entry["failures"] - FETCH_BREAKER_THRESHOLD
+            if extra < 0:
+                return
+            cooldown = min(
+                FETCH_BREAKER_COOLDOWN * 2**extra, FETCH_BREAKER_MAX_COOLDOWN
+            )
+            entry["open_until"] = time.time() + cooldown
+        print_text(
+            f"Circuit open for {channel_url} after {entry['failures']} failures, "
+            f"skipped for {cooldown // 60} minutes",
+            "W",
+        )
+
+    def stats(self) -> str:
+        now = time.time()
+        circuits = sum(entry["open_until"] > now for entry in self.health.values())
+        return (
+            f"Fetch governor: {self.rate:.2f}/{self.max_rate:.2f} req/s, "
+            f"{self.throttled} throttled, {len(self.unknown)} unknown, "
+            f"{circuits} circuits open"
+        )
+
+
+class ChannelProbe:
+    """
+    Cheap change probe in front of the full /streams extraction: a conditional
+    GET on the channel RSS feed. Validators are read from and saved with the
+    run in the probe table of state.db; the ones of a changed feed stay
+    pending until the channel is extracted, so a failed extraction is
+    retried on the next run instead of hitting a 304.
+    """
+
+    def __init__(self, state: dict | None = None):
+        import requests
+
+        self.state = {} if state is None else state
+        self.pending = {}  # channel_url -> validators of a changed feed
+        self.skipped = 0
+        self.session = requests.Session()
+        self.session.headers.update({"User-Agent": USER_AGENT})
+        self._lock = threading.Lock()
+
+    def remember(self, channel_url: str, channel_id: str | None) -> None:
+        """Called after a full extraction of the channel."""
+        with self._lock:
+            entry = self.state.setdefault(channel_url, {})
+            entry.update(self.pending.pop(channel_url, {}))
+            if channel_id:
+                entry["channel_id"] = channel_id
+            entry["extracted_at"] = int(time.time())
+
+    def forget(self, channel_url: str) -> None:
+        """Called when the extraction failed: keep the old validators."""
+        with self._lock:
+            self.pending.pop(channel_url, None)
+
+    def is_changed(self, channel_url: str) -> bool:
+        """True when the channel needs a full extraction."""
+        import requests
+
+        with self._lock:
+            entry = dict(self.state.get(channel_url, {}))
+        channel_id = entry.get("channel_id")
+        if not channel_id:
+            return True
+        if time.time() - entry.get("extracted_at", 0) > PROBE_MAX_AGE:
+            return True
+
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+        try:
+            response = self.session.get(
+                FEED_URL.format(channel_id), headers=headers, timeout=10
+            )
+        except requests.RequestException as e:
+            print_text(f"Probe failed for {channel_url}: {e}", "W")
+            return True
+        if response.status_code == 304:
+            return False
+        if response.status_code != 200:
+            return True
+
+        # view counts change all the time, only ids and titles matter
+        try:
+            root = ET.fromstring(response.content)
+        except ET.ParseError:
+            return True
+        ns = {
+            "atom": "http://www.w3.org/2005/Atom",
+            "yt": "http://www.youtube.com/xml/schemas/2015",
+        }
+        digest = md5(
+            "\n".join(
+                f"{item.findtext('yt:videoId', '', ns)}\t{item.findtext('atom:title', '', ns)}"
+                for item in root.findall("atom:entry", ns)
+            ).encode("utf-8")
+        ).hexdigest()
+        validators = {
+            "digest": digest,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+        with self._lock:
+            stored = self.state.setdefault(channel_url, {})
+            changed = stored.get("digest") != digest
+            if changed:
+                self.pending[channel_url] = validators
+            else:
+                stored.update(validators)
+        return changed
+
+    def select(
+        self, channel_urls: list[str], prev_upcoming: dict, prev_live: dict
+    ) -> tuple[list[str], dict, dict]:
+        """
+        Split channels into the ones to extract and the ones whose previous
+        snapshot is carried forward unchanged.
+        """
+        due = time.time() + LIMIT * 60
+        prev_by_url = {}
+        for snapshot in (prev_upcoming, prev_live):
+            for channel_id, info in snapshot.items():
+                prev_by_url.setdefault(info.channel_url, channel_id)
+
+        def needs_fetch(channel_url: str) -> bool:
+            channel_id = prev_by_url.get(channel_url)
+            if channel_id is None:
+                return True
+            # live streams may end and upcoming streams may start at any time
+            if channel_id in prev_live and prev_live[channel_id].videos:
+                return True
+            if channel_id in prev_upcoming:
+                for video in prev_upcoming[channel_id].videos:
+                    if video.scheduled_at is not None and video.scheduled_at <= due:
+                        return True
+            return self.is_changed(channel_url)
+
+        with ThreadPoolExecutor(max_workers=10) as executor:
+            flags = list(executor.map(needs_fetch, channel_urls))
+
+        to_fetch = []
+        carried_upcoming = {}
+        carried_live = {}
+        for channel_url, flag in zip(channel_urls, flags):
+            if flag:
+                to_fetch.append(channel_url)
+                continue
+            channel_id = prev_by_url[channel_url]
+            if channel_id in prev_upcoming:
+                carried_upcoming[channel_id] = prev_upcoming[channel_id]
+            if channel_id in prev_live:
+                carried_live[channel_id] = prev_live[channel_id]
+        self.skipped = len(channel_urls) - len(to_fetch)
+        return to_fetch, carried_upcoming, carried_live
+
+    def entries(self, channel_urls: list[str] | None = None) -> dict:
+        """Copy of the committed state, for state.db or a shard file."""
+        wanted = None if channel_urls is None else set(channel_urls)
+        with self._lock:
+            return {
+                channel_url: dict(entry)
+                for channel_url, entry in self.state.items()
+                if wanted is None or channel_url in wanted
+            }
+
+
+class TitleCache:
+    """
+    Translated titles in titles.db behind an in-memory LRU. One connection
+    (WAL mode) for the whole process, last_accessed is written in one
+    transaction by flush() instead of one commit per lookup.
+    """
+
+    def __init__(self, path: str = DB_PATH, size: int = TITLE_CACHE_SIZE):
+        self.size = size
+        self.hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self._lru = OrderedDict()
+        self._touched = {}  # original_title -> (translated_title, last_accessed)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS video_titles (
+                original_title TEXT PRIMARY KEY,
+                translated_title TEXT,
+                last_accessed INTEGER
+            )
+        """
+        )
+        self.conn.commit()
+
+    def _remember(self, original_title: str, translated_title: str) -> None:
+        self._lru[original_title] = translated_title
+        self._lru.move_to_end(original_title)
+        if len(self._lru) > self.size:
+            self._lru.popitem(last=False)
+        self._touched[original_title] = (translated_title, int(time.time()))
+
+    def lookup(self, original_title: str) -> str | None:
+        """Cached translation or None, never calls the translator."""
+        with self._lock:
+            translated_title = self._lru.get(original_title)
+            if translated_title is not None:
+                self.hits += 1
+                self._remember(original_title, translated_title)
+                return translated_title
+
+            row = self.conn.execute(
+                "SELECT translated_title FROM video_titles WHERE original_title = ?",
+                (original_title,),
+            ).fetchone()
+            translated_title = None
+            if row is not None:
+                translated_title = row[0] if row[0] is not None else original_title
+            if translated_title is None or TRANSLATE_ERROR in translated_title:
+                self.misses += 1
+                return None
+            self.db_hits += 1
+            self._remember(original_title, translated_title)
+            return translated_title
+
+    def store(self, original_title: str, translated_title: str) -> None:
+        with self._lock:
+            self._remember(original_title, translated_title)
+
+    def get(self, original_title: str, translate_func) -> str:
+        translated_title = self.lookup(original_title)
+        if translated_title is not None:
+            return translated_title
+        translated_title = translate_func(original_title)
+        self.store(original_title, translated_title)
+        return translated_title
+
+    def flush(self) -> None:
+        """Write every new translation and last_accessed in one transaction."""
+        with self._lock:
+            touched, self._touched = self._touched, {}
+            if not touched:
+                return
+            with self.conn:
+                self.conn.executemany(
+                    """
+                    INSERT INTO video_titles (original_title, translated_title, last_accessed)
+                    VALUES (?, ?, ?)
+                    ON CONFLICT(original_title) DO UPDATE SET
+                        translated_title = excluded.translated_title,
+                        last_accessed = excluded.last_accessed
+                    """,
+                    [(title, *value) for title, value in touched.items()],
+                )
+
+    def clean_up(self, days: int = 1) -> None:
+        self.flush()
+        cutoff_time = int((datetime.now() - timedelta(days=days)).timestamp())
+        with self._lock, self.conn:
+            self.conn.execute(
+                "DELETE FROM video_titles WHERE last_accessed < ?", (cutoff_time,)
+            )
+
+    def close(self) -> None:
+        self.flush()
+        with self._lock:
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self.conn.close()
+
+    def stats(self) -> str:
+        total = self.hits + self.db_hits + self.misses
+        rate = (self.hits + self.db_hits) / total * 100 if total else 0
+        return (
+            f"Title cache: {self.hits} memory hits, {self.db_hits} db hits, "
+            f"{self.misses} misses ({rate:.1f}% hit rate)"
+        )
+
+
+class MailTransport:
+    """
+    One authenticated SMTP session, opened on the first message and reused
+    for the rest of the run (and across daemon iterations). A session idle
+    for more than SMTP_KEEPALIVE seconds is checked with NOOP before use,
+    transient failures reconnect and retry with backoff.
+    """
+
+    def __init__(
+        self,
+        host: str = SMTP_HOST,
+        port: int = SMTP_PORT,
+        tls: str = SMTP_TLS,
+        user: str | None = SENDER_EMAIL,
+        password: str | None = SENDER_PWD,
+    ):
+        self.host = host
+        self.port = port
+        self.tls = tls
+        self.user = user
+        self.password = password
+        self.sent = 0
+        self.connections = 0
+        self._server = None
+        self._last_used = 0.0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> "smtplib.SMTP":
+        import smtplib
+
+        if self.tls == "ssl":
+            server = smtplib.SMTP_SSL(self.host, self.port, timeout=SMTP_TIMEOUT)
+        else:
+            server = smtplib.SMTP(self.host, self.port, timeout=SMTP_TIMEOUT)
+            if self.tls == "starttls":
+                server.starttls()
+        if self.password:
+            server.login(self.user, self.password)
+        self.connections += 1
+        return server
+
+    def _session(self) -> "smtplib.SMTP":
+        import smtplib
+
+        if (
+            self._server is not None
+            and time.monotonic() - self._last_used > SMTP_KEEPALIVE
+        ):
+            try:
+                if self._server.noop()[0] != 250:
+                    self.reset()
+            except (smtplib.SMTPException, OSError):
+                self.reset()
+        if self._server is None:
+            self._server = self._connect()
+        return self._server
+
+    @staticmethod
+    def is_transient(error: Exception) -> bool:
+        """4xx answers and dropped connections, never a refused message."""
+        import smtplib
+
+        if isinstance(error, smtplib.SMTPAuthenticationError):
+            return False
+        if isinstance(error, smtplib.SMTPRecipientsRefused):
+            codes = [code for code, _ in error.recipients.values()]
+            return bool(codes) and all(400 <= code < 500 for code in codes)
+        if isinstance(error, smtplib.SMTPResponseException):
+            return 400 <= error.smtp_code < 500
+        if isinstance(error, smtplib.SMTPServerDisconnected):
+            return True
+        # every SMTPException is an OSError, the rest of them are permanent
+        if isinstance(error, smtplib.SMTPException):
+            return False
+        return isinstance(error, OSError)
+
+    def send(self, msg: "MIMEMultipart") -> None:
+        with self._lock:
+            for attempt in range(SMTP_RETRIES):
+                try:
+                    self._session().send_message(msg)
+                    self._last_used = time.monotonic()
+                    self.sent += 1
+                    return
+                except Exception as e:
+                    self.reset()
+                    if not self.is_transient(e) or attempt == SMTP_RETRIES - 1:
+                        raise
+                    print_text(f"SMTP error, retrying: {e}", "W")
+                    time.sleep(2**attempt)
+
+    def reset(self) -> None:
+        """Drop the session without QUIT, the next send reconnects."""
+        if self._server is not None:
+            try:
+                self._server.close()
+            except OSError:
+                pass
+        self._server = None
+
+    def close(self) -> None:
+        import smtplib
+
+        with self._lock:
+            if self._server is not None:
+                try:
+                    self._server.quit()
+                except (smtplib.SMTPException, OSError):
+                    pass
+            self.reset()
+
+    def stats(self) -> str:
+        return f"SMTP: {self.sent} emails over {self.connections} connections"
+
+
+class DiscordWebhook:
+    """
+    Webhook client on a pooled requests.Session. Long messages are split on
+    channel sections ("## ...") and sent in order; 429 answers and the
+    X-RateLimit-* headers are honoured before the next request.
+    """
+
+    def __init__(self, url: str, embeds: bool = DISCORD_EMBEDS):
+        import requests
+
+        self.url = url
+        self.embeds = embeds
+        self.max_length = 4096 if embeds else DISCORD_MAX_LENGTH
+        self.session = requests.Session()
+        self.session.headers["Content-Type"] = "application/json"
+        self.sent = 0
+        self.rate_limited = 0
+        self._wait_until = 0.0
+
+    @staticmethod
+    def split_lines(text: str, limit: int) -> list[str]:
+        chunks = [""]
+        for line in text.splitlines(keepends=True):
+            while len(line) > limit:
+                chunks.append(line[:limit])
+                line = line[limit:]
+            if len(chunks[-1]) + len(line) > limit:
+                chunks.append("")
+            chunks[-1] += line
+        return [chunk for chunk in chunks if chunk]
+
+    def split(self, message: str) -> list[str]:
+        """Chunks of at most max_length, cut between channels when possible."""
+        chunks = []
+        for section in re.split(r"(?m)^(?=## )", message):
+            if len(section) > self.max_length:
+                chunks.extend(self.split_lines(section, self.max_length))
+            elif chunks and len(chunks[-1]) + len(section) <= self.max_length:
+                chunks[-1] += section
+            elif section:
+                chunks.append(section)
+        return chunks
+
+    def payload(self, chunk: str, index: int, total: int) -> dict:
+        if not self.embeds:
+            return {"content": chunk}
+        embed = {"description": chunk, "color": 0xFF4500}
+        if total > 1:
+            embed["footer"] = {"text": f"{index + 1}/{total}"}
+        return {"embeds": [embed]}
+
+    def _respect_rate_limit(self, response: "requests.Response") -> None:
+        if response.headers.get("X-RateLimit-Remaining") == "0":
+            reset_after = float(response.headers.get("X-RateLimit-Reset-After", 1))
+            self._wait_until = time.monotonic() + reset_after
+
+    def post(self, payload: dict) -> bool:
+        import requests
+
+        for attempt in range(DISCORD_RETRIES):
+            delay = self._wait_until - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                response = self.session.post(self.url, json=payload, timeout=10)
+            except requests.RequestException as e:
+                print_text(f"Discord request failed: {e}", "W")
+                time.sleep(2**attempt)
+                continue
+            self._respect_rate_limit(response)
+            if response.status_code == 429:
+                self.rate_limited += 1
+                try:
+                    retry_after = float(response.json().get("retry_after", 1))
+                except ValueError:
+                    retry_after = float(response.headers.get("Retry-After", 1))
+                print_text(f"Discord rate limited, retrying in {retry_after}s", "W")
+                self._wait_until = time.monotonic() + retry_after
+                continue
+            if response.status_code >= 500:
+                time.sleep(2**attempt)
+                continue
+            if response.status_code in (200, 204):
+                self.sent += 1
+                return True
+            print(
+                f"Failed to send message. Status code: {response.status_code}, Response: {response.text}"
+            )
+            return False
+        return False
+
+    def send(self, message: str) -> bool:
+        chunks = self.split(message)
+        for index, chunk in enumerate(chunks):
+            if not self.post(self.payload(chunk, index, len(chunks))):
+                return False
+        return True
+
+    def close(self) -> None:
+        self.session.close()
+
+
+class UrgentNotifier:
+    """
+    Notification stage of the streaming mode. Per-channel results are put on
+    the queue by the fetch engine as they complete; a worker thread sends the
+    urgent ones (went live, starting within LIMIT, new unarchived) right
+    away instead of after the slowest channel. The digest is still sent at
+    the end of the run. Each reason is sent once per video, across runs.
+    """
+
+    def __init__(self, prev_upcoming: dict, prev_live: dict):
+        self.queue = queue.Queue()
+        self.previous = index_videos(prev_upcoming, prev_live)
+        self.first_run = get_state_store().is_first_run()
+        self.notified = get_state_store().notified()  # (video_id, reason)
+        self.sent = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> "UrgentNotifier":
+        self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            try:
+                self.handle(*item)
+            except Exception as e:
+                print_text(f"Urgent notification failed: {e}", "E")
+
+    def reasons(self, video: Video) -> list[str]:
+        old = self.previous.get(video.video_id)
+        reasons = []
+        if video.status == StreamStatus.LIVE and (
+            old is None or old[1] == StreamStatus.UPCOMING
+        ):
+            reasons.append("🔴 Went live")
+        if (
+            video.status == StreamStatus.UPCOMING
+            and video.scheduled_at is not None
+            and video.scheduled_at - time.time() <= LIMIT * 60
+        ):
+            reasons.append("⏰ Starting soon")
+        if old is None and "Unarchived" in get_filter_matcher().match_video(video):
+            reasons.append("🚨 Unarchived")
+        return reasons
+
+    def handle(self, upcoming: dict, live_streams: dict) -> None:
+        if self.first_run:
+            return  # every stream would look new
+        for status, snapshot in (
+            (StreamStatus.UPCOMING, upcoming),
+            (StreamStatus.LIVE, live_streams),
+        ):
+            for channel_id, info in snapshot.items():
+                urgent = []
+                for video in info.videos:
+                    reasons = [
+                        reason
+                        for reason in self.reasons(video)
+                        if (video.video_id, reason) not in self.notified
+                    ]
+                    if reasons:
+                        urgent.append((video, reasons))
+                if not urgent:
+                    continue
+                self.send(channel_id, info, status, urgent)
+                keys = {
+                    (video.video_id, reason)
+                    for video, reasons in urgent
+                    for reason in reasons
+                }
+                self.notified |= keys
+                get_state_store().mark_notified(keys)
+
+    def send(
+        self, channel_id: str, info: Channel, status: StreamStatus, urgent: list
+    ) -> None:
+        reasons = sorted(
+            {reason for _, videos_reasons in urgent for reason in videos_reasons}
+        )
+        message = [
+            f"# ⚡ {', '.join(reasons)}\n## {info.channel_name} ({channel_id})\n---\n"
+        ]
+        videos = []
+        for video, video_reasons in urgent:
+            message.append(
+                f"- {' / '.join(video_reasons)}: {video.title}\n- Stream ID: [{video.video_id}](https://www.youtube.com/watch?v={video.video_id})\n---\n"
+            )
+            videos.append(
+                video_context(
+                    video,
+                    get_translated_title(video.title),
+                    classes=(
+                        [f"unarchived-{status}"]
+                        if "🚨 Unarchived" in video_reasons
+                        else []
+                    ),
+                    labels=[],
+                    link_text=(
+                        "▶️ Watch Stream"
+                        if status == StreamStatus.LIVE
+                        else "▶️ Open Stream"
+                    ),
+                )
+            )
+        block = fill_slots(
+            render_channel(channel_context(channel_id, info), videos),
+            [video_slots() for _ in videos],
+        )
+        subject = f"[{ENV_LIST.get(ENV, 'UNKNOWN')}] ⚡ {', '.join(reasons)}: {info.channel_name}"
+        send_email(subject, render_page(f"⚡ {', '.join(reasons)}", "", [block]))
+        send_discord_message(DISCORD_WEBHOOK_URL, "".join(message))
+        self.sent += len(urgent)
+
+    def close(self) -> None:
+        """Wait until every queued result has been handled."""
+        self.queue.put(None)
+        self._thread.join()
+
+
 # ====================== HELPER FUNCTIONS ======================
 # logging.basicConfig(
 #     filename="yt-dlp.log",  # File log
@@ -144,95 +1860,147 @@ class Color:
 # )
 
 
+def get_inflect_engine():
+    global inflect_engine
+    if inflect_engine is None:
+        import inflect
+
+        inflect_engine = inflect.engine()
+    return inflect_engine
+
+
+title_cache: TitleCache | None = None
+
+
+def get_title_cache() -> TitleCache:
+    global title_cache
+    if title_cache is None:
+        title_cache = TitleCache()
+    return title_cache
+
+
 def init_db():
     """Khởi tạo cơ sở dữ liệu nếu chưa tồn tại."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute(
-        """
-        CREATE TABLE IF NOT EXISTS video_titles (
-            original_title TEXT PRIMARY KEY,
-            translated_title TEXT,
-            last_accessed INTEGER
-        )
+    get_title_cache()
+
+
+def is_bad_translation(trans_title: str | None) -> bool:
+    return trans_title is None or TRANSLATE_ERROR in trans_title
+
+
+def translate_title(
+    title: str, translator_: "GoogleTranslator", deadline: float
+) -> str | None:
     """
-    )
-    conn.commit()
-    conn.close()
+    Translate one title, retrying empty and "Error 500" answers with backoff
+    until the deadline. None when it still failed.
+    """
+    for attempt in range(TRANSLATE_RETRIES):
+        if time.monotonic() >= deadline:
+            return None
+        try:
+            trans_title = translator_.translate(title)
+        except Exception as e:
+            print_text(f"Failed to translate {title!r}: {e}", "W")
+            trans_title = None
+        if not is_bad_translation(trans_title):
+            return trans_title
+        time.sleep(min(2**attempt, max(deadline - time.monotonic(), 0)))
+    return None
+
+
+def translate_batch(titles: list[str], deadline: float) -> dict[str, str]:
+    """
+    Translate one batch with translate_batch, then retry the titles that
+    failed one by one until the deadline. Titles still failing are left out.
+    """
+    from deep_translator import GoogleTranslator
+
+    translator_ = GoogleTranslator(source=from_lang, target=to_lang)
+    try:
+        results = dict(zip(titles, translator_.translate_batch(titles)))
+    except Exception as e:
+        print_text(f"Batch translation failed, retrying one by one: {e}", "W")
+        results = {}
 
+    translated = {
+        title: trans_title
+        for title, trans_title in results.items()
+        if not is_bad_translation(trans_title)
+    }
+    for title in titles:
+        if title in translated:
+            continue
+        if time.monotonic() >= deadline:
+            break
+        trans_title = translate_title(title, translator_, deadline)
+        if trans_title is not None:
+            translated[title] = trans_title
+    return translated
+
+
+def translate_titles(*snapshots: dict, budget: float = TRANSLATE_BUDGET) -> int:
+    """
+    Translation stage, run before rendering: collect every title of the
+    snapshots that is not cached yet, deduplicate them and translate them in
+    batches with a few workers and a time budget. Returns how many were added.
+    """
+    if not TRANSLATE_TITLES:
+        return 0
+    cache = get_title_cache()
+    titles = dict.fromkeys(
+        video.title
+        for snapshot in snapshots
+        for info in snapshot.values()
+        for video in info.videos
+        if video.title
+    )
+    missing = [title for title in titles if cache.lookup(title) is None]
+    if not missing:
+        return 0
+
+    start = time.monotonic()
+    deadline = start + budget
+    batches = [
+        missing[i : i + TRANSLATE_BATCH_SIZE]
+        for i in range(0, len(missing), TRANSLATE_BATCH_SIZE)
+    ]
+    translated = 0
+    executor = ThreadPoolExecutor(max_workers=TRANSLATE_WORKERS)
+    futures = [executor.submit(translate_batch, batch, deadline) for batch in batches]
+    try:
+        for future in as_completed(futures, timeout=budget):
+            for title, trans_title in future.result().items():
+                cache.store(title, trans_title)
+                translated += 1
+    except TimeoutError:
+        print_text("Translation budget exceeded, using original titles", "W")
+    except Exception as e:
+        print_text(f"Translation failed: {e}", "E")
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
 
-def translate_title(title: str) -> str:
-    return title
-    # trans_title = translator.translate(title)
-    if trans_title is None:
-        trans_title = translator.translate(title)
-    elif "Error 500 (Server Error)!!1500.That’s an error.There was an error. Please try again later.That’s all we know." in trans_title:
-        trans_title = translator.translate(title)
-    return trans_title
+    print_text(
+        f"Translated {translated}/{len(missing)} titles in {time.monotonic() - start:.2f}s"
+    )
+    return translated
 
 
-def get_translated_title(original_title, translate_func):
+def get_translated_title(original_title, translate_func=None):
     """
     Lấy tiêu đề đã dịch hoặc dịch nếu chưa tồn tại.
     :param original_title: Tiêu đề gốc
-    :param translate_func: Hàm dịch tiêu đề
+    :param translate_func: Hàm dịch tiêu đề, None: chỉ đọc cache
     :return: Tiêu đề đã dịch
     """
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    current_time = int(time.time())
-
-    # Kiểm tra trong cơ sở dữ liệu
-    cursor.execute(
-        "SELECT translated_title FROM video_titles WHERE original_title = ?",
-        (original_title,),
-    )
-    row = cursor.fetchone()
-
-    if row:
-        # Cập nhật thời gian truy cập
-        row_0 = ""
-        if row[0] is None:
-            row_0 = original_title
-        else:
-            row_0 = row[0]
-        if "Error 500 (Server Error)!!1500.That’s an error.There was an error. Please try again later.That’s all we know." in row_0:
-            translated_title = translate_func(original_title)
-            cursor.execute(
-                "UPDATE video_titles SET translated_title = ?, last_accessed = ? WHERE original_title = ?",
-                (translated_title, current_time, original_title),
-            )
-            conn.commit()
-            conn.close()
-            return translated_title
-        else:
-            cursor.execute(
-                "UPDATE video_titles SET last_accessed = ? WHERE original_title = ?",
-                (current_time, original_title),
-            )
-            conn.commit()
-            conn.close()
-            return row_0
-    else:
-        # Dịch và lưu lại
-        translated_title = translate_func(original_title)
-        cursor.execute(
-            "INSERT INTO video_titles (original_title, translated_title, last_accessed) VALUES (?, ?, ?)",
-            (original_title, translated_title, current_time),
-        )
-        conn.commit()
-        conn.close()
-        return translated_title
+    if translate_func is None:
+        return get_title_cache().lookup(original_title) or original_title
+    return get_title_cache().get(original_title, translate_func)
 
 
 def clean_up_old_titles(days=1):
     """Xóa các tiêu đề không được truy cập trong N ngày qua."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cutoff_time = int((datetime.now() - timedelta(days=days)).timestamp())
-    cursor.execute("DELETE FROM video_titles WHERE last_accessed < ?", (cutoff_time,))
-    conn.commit()
-    conn.close()
+    get_title_cache().clean_up(days)
 
 
 def get_clock_emoji(dt: datetime) -> str:
@@ -334,20 +2102,32 @@ def count_title_description(
     return num, is_true
 
 
-def send_email(subject: str, body: str) -> None:
+mail_transport: MailTransport | None = None
+
+
+def get_mail_transport() -> MailTransport:
+    global mail_transport
+    if mail_transport is None:
+        mail_transport = MailTransport()
+    return mail_transport
+
+
+def build_message(subject: str, body: str) -> "MIMEMultipart":
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
+
     msg = MIMEMultipart()
     msg["From"] = SENDER_EMAIL
     msg["To"] = RECEIVER_EMAIL
     msg["Subject"] = subject
     msg.attach(MIMEText(body, "html"))
+    return msg
 
+
+def send_email(subject: str, body: str) -> None:
     try:
-        server = smtplib.SMTP("smtp.gmail.com", 587)
-        server.starttls()
-        server.login(SENDER_EMAIL, SENDER_PWD)
-        text = msg.as_string()
-        server.sendmail(SENDER_EMAIL, RECEIVER_EMAIL, text)
-        server.quit()
+        with get_metrics().stage("smtp"):
+            get_mail_transport().send(build_message(subject, body))
         print_text("Email sent successfully!", "S")
     except Exception as e:
         print_text(f"Failed to send email: {e}", "E")
@@ -356,13 +2136,245 @@ def send_email(subject: str, body: str) -> None:
 def sort_obj(obj):
     obj = dict(sorted(obj.items(), key=lambda item: item[0]))
 
-    for id_obj in obj.values():
-        id_obj["videos"] = sorted(id_obj["videos"], key=lambda video: video["video_id"])
+    for channel in obj.values():
+        channel.videos.sort(key=lambda video: video.video_id)
 
     return obj
 
 
-def pretty_time_delta(delta, lang=inflect.engine()):
+def canonical_hash(obj) -> str:
+    """md5 of a canonical JSON dump: key order and whitespace do not matter."""
+    return md5(
+        json.dumps(
+            obj, sort_keys=True, ensure_ascii=False, separators=(",", ":")
+        ).encode("utf-8")
+    ).hexdigest()
+
+
+def hash_video(video: dict) -> str:
+    return canonical_hash(
+        {key: value for key, value in video.items() if key not in HASH_EXCLUDE_FIELDS}
+    )
+
+
+def hash_channels(snapshot: dict) -> dict:
+    """channel_id -> {"hash": ..., "videos": {video_id: hash}} for non empty channels."""
+    channel_hashes = {}
+    for channel_id, info in snapshot.items():
+        if not info.videos:
+            continue
+        # hashed in the JSON shape, the stored hashes stay valid
+        channel_fields = info.to_dict()
+        video_hashes = {
+            video["video_id"]: hash_video(video)
+            for video in channel_fields.pop("videos")
+        }
+        channel_fields = {
+            key: value
+            for key, value in channel_fields.items()
+            if key not in HASH_EXCLUDE_FIELDS
+        }
+        channel_hashes[channel_id] = {
+            "hash": canonical_hash([channel_fields, sorted(video_hashes.items())]),
+            "videos": video_hashes,
+        }
+    return channel_hashes
+
+
+def combine_hashes(channel_hashes: dict) -> str:
+    """Whole-run hash built from the per-channel hashes."""
+    if not channel_hashes:
+        return ""
+    return canonical_hash(
+        sorted(
+            (channel_id, hashes["hash"])
+            for channel_id, hashes in channel_hashes.items()
+        )
+    )
+
+
+filter_matcher: FilterMatcher | None = None
+
+
+def get_filter_matcher() -> FilterMatcher:
+    global filter_matcher
+    if filter_matcher is None:
+        filter_matcher = FilterMatcher(FILTERS)
+    return filter_matcher
+
+
+def apply_filters(video: Video) -> None:
+    """Set is_true and bump the counters of FILTERS for one video."""
+    categories = get_filter_matcher().match_video(video)
+    for category, filters in FILTERS.items():
+        filters["is_true"] = category in categories
+        if filters["is_true"]:
+            filters["counter"] += 1
+
+
+hash_store: HashStore | None = None
+render_cache: BlockCache | None = None
+
+
+def get_hash_store() -> HashStore:
+    global hash_store
+    if hash_store is None:
+        hash_store = HashStore(get_state_store().hashes())
+    return hash_store
+
+
+run_metrics: RunMetrics | None = None
+
+
+def get_metrics() -> RunMetrics:
+    global run_metrics
+    if run_metrics is None:
+        run_metrics = RunMetrics()
+    return run_metrics
+
+
+def reset_metrics() -> RunMetrics:
+    """Start the metrics of a new run, each daemon cycle is one."""
+    global run_metrics
+    run_metrics = RunMetrics()
+    return run_metrics
+
+
+fetch_governor: FetchGovernor | None = None
+
+
+def get_fetch_governor() -> FetchGovernor:
+    global fetch_governor
+    if fetch_governor is None:
+        fetch_governor = FetchGovernor(get_state_store().health())
+    return fetch_governor
+
+
+state_store: StateStore | None = None
+
+
+def get_state_store() -> StateStore:
+    global state_store
+    if state_store is None:
+        state_store = StateStore()
+    return state_store
+
+
+def index_videos(upcoming: dict, live_streams: dict) -> dict:
+    """video_id -> (channel_id, status, video) for one snapshot."""
+    index = {}
+    for status, snapshot in (
+        (StreamStatus.UPCOMING, upcoming),
+        (StreamStatus.LIVE, live_streams),
+    ):
+        for channel_id, info in snapshot.items():
+            for video in info.videos:
+                index[video.video_id] = (channel_id, status, video)
+    return index
+
+
+def diff_streams(
+    prev_upcoming: dict, prev_live: dict, upcoming: dict, live_streams: dict
+) -> list[StreamEvent]:
+    """
+    Compare two snapshots through video_id indexes and return typed events:
+    added, removed, went live, rescheduled and title changed.
+    """
+    previous = index_videos(prev_upcoming, prev_live)
+    current = index_videos(upcoming, live_streams)
+    events = []
+    for video_id, (channel_id, status, video) in current.items():
+        old = previous.get(video_id)
+        if old is None:
+            events.append(
+                StreamEvent(EventKind.ADDED, channel_id, video_id, status, video)
+            )
+            continue
+        _, old_status, old_video = old
+        if old_status == StreamStatus.UPCOMING and status == StreamStatus.LIVE:
+            events.append(
+                StreamEvent(
+                    EventKind.WENT_LIVE, channel_id, video_id, status, video, old_video
+                )
+            )
+        elif (
+            status == StreamStatus.UPCOMING
+            and old_video.scheduled_at != video.scheduled_at
+        ):
+            events.append(
+                StreamEvent(
+                    EventKind.RESCHEDULED,
+                    channel_id,
+                    video_id,
+                    status,
+                    video,
+                    old_video,
+                )
+            )
+        if old_video.title != video.title:
+            events.append(
+                StreamEvent(
+                    EventKind.TITLE_CHANGED,
+                    channel_id,
+                    video_id,
+                    status,
+                    video,
+                    old_video,
+                )
+            )
+    for video_id in previous.keys() - current.keys():
+        channel_id, old_status, old_video = previous[video_id]
+        events.append(
+            StreamEvent(EventKind.REMOVED, channel_id, video_id, old_status, old_video)
+        )
+    return events
+
+
+def get_stream_events(upcoming: dict, live_streams: dict) -> list[StreamEvent]:
+    """Events between the saved snapshots (previous run) and this run."""
+    store = get_state_store()
+    # the tracked channels are seeded before the first run, an empty snapshot
+    # dict cannot tell it apart from later runs
+    if store.is_first_run():
+        print_text("No previous run, skipping events", "W")
+        return []
+    prev_upcoming = store.snapshot(StreamStatus.UPCOMING)
+    prev_live = store.snapshot(StreamStatus.LIVE)
+    events = diff_streams(prev_upcoming, prev_live, upcoming, live_streams)
+    counts = {}
+    for event in events:
+        counts[event.kind] = counts.get(event.kind, 0) + 1
+    print_text(
+        "Events: "
+        + (", ".join(f"{count} {kind}" for kind, count in counts.items()) or "none")
+    )
+    return events
+
+
+def filter_events(
+    events: list[StreamEvent], *kinds: str, status: StreamStatus | None = None
+):
+    return {
+        event.video_id: event
+        for event in events
+        if event.kind in kinds and (status is None or event.status == status)
+    }
+
+
+def short_time_delta(delta: timedelta) -> str:
+    """Compact duration for the console ("1h 2m 3.45s"), without inflect."""
+    seconds = abs(delta.total_seconds())
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(int(minutes), 60)
+    parts = [f"{hours}h"] if hours else []
+    if hours or minutes:
+        parts.append(f"{minutes}m")
+    parts.append(f"{seconds:.2f}s")
+    return " ".join(parts)
+
+
+def pretty_time_delta(delta, lang=None):
+    lang = lang or get_inflect_engine()
     seconds = delta.total_seconds()
     if not seconds:
         return "0 seconds"
@@ -384,401 +2396,453 @@ def pretty_time_delta(delta, lang=inflect.engine()):
     )
 
 
+discord_webhooks: dict[str, DiscordWebhook] = {}
+
+
+def get_discord_webhook(webhook_url: str) -> DiscordWebhook:
+    if webhook_url not in discord_webhooks:
+        discord_webhooks[webhook_url] = DiscordWebhook(webhook_url)
+    return discord_webhooks[webhook_url]
+
+
 def send_discord_message(webhook_url, message):
-    headers = {"Content-Type": "application/json"}
-    data = {"content": message}
-    response = requests.post(webhook_url, json=data, headers=headers)
-    if response.status_code == 204:
+    if not webhook_url:
+        print_text("DISCORD_WEBHOOK_URL is not set, skipping Discord", "W")
+        return
+    with get_metrics().stage("discord"):
+        sent = get_discord_webhook(webhook_url).send(message)
+    if sent:
         print("Message sent successfully!")
-    else:
-        print(
-            f"Failed to send message. Status code: {response.status_code}, Response: {response.text}"
-        )
 
 
 # ====================== UTILITY FUNCTIONS ======================
-def send_email_upcoming(live_streams: str) -> None:
-    # format time (now)
-    now_ = datetime.now(pytz.timezone("Asia/Ho_Chi_Minh")).strftime("%Y/%m/%d %H:%M:%S")
-    message = "# 📹 Upcoming Unarchived YouTube Live Streams\n"
-    channel_lst = []
-    is_send = False
-    # subject and body when send email
-    subject = f"{UPCOMING_SUBJECT} {now_}"
-    body = ""
-
-    now_ = datetime.strptime(now_, "%Y/%m/%d %H:%M:%S")
-    # variables
-    need_red = False  # change text to red
-    prev_upcoming_streams = {}
-
-    # count variables
-    upcoming_counter = 0
-    for filters in FILTERS.items():
-        filters[1]["counter"] = 0
-    new_counter = 0
-    total_streams = 0
-
-    # label template
-    new_label = '<span style="font-weight: bold; background-color: greenyellow; padding: 3px; margin: 4px; border-radius: 30%;">New!</span>'
-
-    # load previous upcoming streams save in file json
-    with open("./upcoming.json", "r", encoding="utf-8") as file:
-        prev_upcoming_streams = json.load(file)
+def get_render_cache() -> BlockCache:
+    global render_cache
+    if render_cache is None:
+        render_cache = BlockCache()
+    return render_cache
+
+
+def render_streams(
+    live_streams: dict,
+    status: StreamStatus,
+    new_ids: dict,
+    rescheduled_ids: dict | None = None,
+    title_changed_ids: dict | None = None,
+    now_: int | None = None,
+) -> dict:
+    """
+    Channel blocks, Discord lines and counters shared by both emails. Blocks
+    go through the render cache; only the countdown is filled in per run.
+    Schedules are formatted here, from the epoch seconds of the videos.
+    """
+    upcoming = status == StreamStatus.UPCOMING
+    now_ = int(time.time()) if now_ is None else now_
+    rescheduled_ids = rescheduled_ids or {}
+    title_changed_ids = title_changed_ids or {}
+    cache = get_render_cache()
+    message = []  # joined once, the Discord message can hold thousands of lines
+    for config in FILTERS.values():
+        config["counter"] = 0
+    result = {
+        "blocks": [],
+        "is_send": False,
+        "new_counter": 0,
+        "soon_counter": 0,
+        "total_streams": 0,
+    }
 
     for channel_id, info in live_streams.items():
-        if info["videos"]:
-            body += f"""
-                        <li style="list-style-type: none;">
-                            <img src="{info.get("avatar_url")}=s900-c-k-c0x00ffffff-no-rj" style="width: 60px; height: 60px; border-radius: 50%; margin-right: 4px; display: inline-block;" />
-                            <strong style="font-size: 18px;">{info['channel_name']} ({channel_id})</strong> - <a href="{info['channel_url']}"><strong>Visit Channel</strong></a>
-                            <ul>
-                    """
-            for video in info["videos"]:
-                # Check new streams
-                exists = True
-                try:
-                    if prev_upcoming_streams.get(channel_id).get("videos") == []:
-                        exists = False
-                    else:
-                        exists = any(
-                            item["video_id"] == video["video_id"]
-                            for item in prev_upcoming_streams.get(channel_id).get(
-                                "videos"
-                            )
-                        )
-                except TypeError as e:
-                    print(f"ERROR: {e}")
-                    print(f"Channel_id at upcoming: {channel_id}")
-                new_counter = new_counter if exists else new_counter + 1
-                # Get delta time
-                schedule_date = datetime.strptime(
-                    video.get("date", "4444/04/04 04:04:04"), "%Y/%m/%d %H:%M:%S"
+        if not info.videos:
+            continue
+        videos = []
+        slots = []
+        in_message = False
+        for video in info.videos:
+            video_id = video.video_id
+            is_new = video_id in new_ids
+            result["new_counter"] += is_new
+            result["total_streams"] += 1
+            apply_filters(video)
+            unarchived = FILTERS["Unarchived"].get("is_true")
+
+            labels = [
+                config["label"]
+                for config in FILTERS.values()
+                if config.get("is_true") and config.get("label")
+            ]
+            if is_new:
+                labels.append(LABELS["new"])
+            if upcoming and video_id in rescheduled_ids:
+                labels.append(LABELS["rescheduled"])
+            if video_id in title_changed_ids:
+                labels.append(LABELS["title-changed"])
+
+            schedule = None
+            soon = False
+            date = None
+            if upcoming and video.scheduled_at is not None:
+                schedule_date = datetime.fromtimestamp(video.scheduled_at, TIMEZONE)
+                date = schedule_date.strftime("%Y/%m/%d %H:%M:%S")
+                delta = timedelta(seconds=video.scheduled_at - now_)
+                soon = delta.total_seconds() <= LIMIT * 60
+                result["soon_counter"] += soon
+                schedule = {
+                    "emoji": get_clock_emoji(schedule_date),
+                    "date": date,
+                    "delta": str(delta),
+                }
+
+            if unarchived:
+                result["is_send"] = True
+                if not in_message:
+                    message.append(f"## {info.channel_name} ({channel_id})\n---\n")
+                    in_message = True
+                message.append(
+                    f"- {'🆕 ' if is_new else ''}Title: {video.title}\n- Stream ID: [{video_id}](https://www.youtube.com/watch?v={video_id})\n"
                 )
-                delta = schedule_date - now_
-                seconds = delta.total_seconds()
-
-                # Check delta if time smaller limit
-                if seconds <= LIMIT * 60:
-                    upcoming_counter += 1
-                    need_red = True
-
-                for filters in FILTERS.items():
-                    _filter = filters[1].get("filter", [])
-                    filters[1]["counter"], filters[1]["is_true"] = (
-                        count_title_description(
-                            filters[1]["counter"],
-                            video["title"],
-                            video["description"],
-                            _filter,
-                        )
+                if date:
+                    message.append(
+                        f"- Scheduled for: {date}{' (rescheduled)' if video_id in rescheduled_ids else ''}\n"
                     )
+                message.append("---\n")
+
+            videos.append(
+                video_context(
+                    video,
+                    get_translated_title(video.title),
+                    classes=[f"unarchived-{status}"] if unarchived else [],
+                    labels=labels,
+                    link_text="▶️ Open Stream" if upcoming else "▶️ Watch Stream",
+                )
+            )
+            slots.append(video_slots(soon, schedule))
+            for config in FILTERS.values():
+                config["is_true"] = False
 
-                # Get emoji
-                emoji = get_clock_emoji(schedule_date)
-                total_streams += 1
-                if FILTERS["Unarchived"].get("is_true"):
-                    is_send = True
-                    if channel_id not in channel_lst:
-                        message += f"## {info['channel_name']} ({channel_id})\n---\n"
-                        channel_lst.append(channel_id)
-                    message += f"- Title: {video['title']}\n- Stream ID: [{video['video_id']}](https://www.youtube.com/watch?v={video['video_id']})\n- Scheduled for: {video['date']}\n---\n"
-
-                body += f"""
-                            <hr />
-                            <li style="list-style-type: none; {"color:red;" if need_red else ""} {"color: blue; font-weight: bold; font-style: oblique;" if FILTERS["Unarchived"].get("is_true") else ""} ">
-                                <span><strong>🏷️ Title: </strong>{video['title']}</span> {"".join(filters[1].get("label", "") if filters[1].get("is_true", False) else "" for filters in FILTERS.items())} {"" if exists else new_label}
-                                <br />
-                                <span><strong>📝 Translated Title: </strong>{get_translated_title(video['title'], translate_title)}</span>
-                                <br />
-                                <span><strong>🆔 Stream ID: </strong><span style="font-weight: bold; font-family: consolas, 'Times New Roman', tahoma; font-size:x-large;">{video['video_id']}</span></span>
-                                <br />
-                                <span><strong>🖼️ Thumbnail: </strong> <img src="{video['thumbnail']}"/></span>
-                                <br />
-                                <span><strong>{emoji} Scheduled for: </strong>{video['date']} ({str(delta)} from now)</span>
-                                <br />
-                                <a href="https://www.youtube.com/watch?v={video['video_id']}"><strong>▶️ Open Stream</strong></a>
-                            </li>
-                        """
-                need_red = False
-                for filters in FILTERS.items():
-                    filters[1]["is_true"] = False
-                    # print(filters)
-            body += "</ul></li>"
-
-    body += "</ul></body></html>"
-    body_first = f"""<!DOCTYPE html>
-                <html>
-                <head>
-                    <meta charset="UTF-8">
-                </head>
-                <body>
-                <h1>📹 Upcoming YouTube Live Streams</h1>
-                <br />
-                {''.join(f'<h2 style="color: {filters[1].get("color", "green")}; font-weight: bold;">{filters[1].get("icon", "📣")} {filters[1].get("counter")} {filters[0]} Live Streams</h2>' if filters[1].get("counter") > 0 else "" for filters in FILTERS.items())}
-                {f'<h2 style="color: blue; font-weight: bold;">🆕 {new_counter} New Live Streams</h2>' if new_counter > 0 else ""}
-                {f'<h2 style="color: orange; font-weight: bold;">💠 {upcoming_counter} Live Streams will live soon!</h2>' if upcoming_counter > 0 else ""}
-                {f'<h2 style="color: #4B0082; font-weight: bold;">📊 {total_streams} Live Streams in total.</h2>'}
-                <ul>
-            """
-    body = body_first + body
-    current_hash = md5(str(live_streams).encode("utf-8")).hexdigest()
-
-    message = f"# `Total {FILTERS['Unarchived'].get('counter')} Unarchived Live Streams.\n` {message}"
+        result["blocks"].append(
+            cache.render(channel_context(channel_id, info), videos, slots)
+        )
+    result["message"] = "".join(message)
+    return result
 
-    is_exists = Path("./prev_hash_upcoming.md5").exists()
-    if not is_exists:
-        print("create file")
-        with open("./prev_hash_upcoming.md5", mode="w", encoding="utf-8") as file:
-            pass
 
-    with open("./prev_hash_upcoming.md5", mode="r+", encoding="utf-8") as file:
-        prev_hash = file.readline().strip()
-        print_text(f"prev_upcoming_hash: {prev_hash}")
-        print_text(f"curr_upcoming_hash: {current_hash}")
-        if prev_hash != current_hash:
-            if is_send:
-                send_discord_message(DISCORD_WEBHOOK_URL, message=message)
-            file.seek(0, 0)
-            file.write(current_hash)
-            send_email(subject, body)
-        else:
-            if upcoming_counter:
-                if is_send:
-                    send_discord_message(DISCORD_WEBHOOK_URL, message=message)
-                send_email(subject, body)
-            else:
-                print_text("Nothing changed!", "S")
+def filter_summary() -> list[tuple[str, str]]:
+    summary = [
+        (
+            config.get("color", "green"),
+            f"{config.get('icon', '📣')} {config['counter']} {name} Live Streams",
+        )
+        for name, config in FILTERS.items()
+        if config["counter"] > 0
+    ]
+    unknown = len(get_fetch_governor().unknown)
+    if unknown:
+        summary.append(
+            (
+                "gray",
+                f"❔ {unknown} channels unknown (fetch failed, previous state kept)",
+            )
+        )
+    return summary
 
 
-def send_email_live(live_streams: str) -> None:
-    subject = f"{LIVE_SUBJECT} {datetime.now(pytz.timezone('Asia/Ho_Chi_Minh')).strftime('%Y/%m/%d %H:%M:%S')}"
-    body = ""
+def build_email_upcoming(
+    live_streams: dict, events: list[StreamEvent] | None = None
+) -> dict:
+    """Subject, HTML body and Discord message of the upcoming email."""
+    now_ = int(time.time())
+    subject = f"{UPCOMING_SUBJECT} {format_date(now_)}"
 
-    message = "# 🔴 Unarchived YouTube Live Streams\n"
-    channel_lst = []
-    is_send = False
+    # events against the previous run (upcoming.json / live_streams.json)
+    if events is None:
+        events = diff_streams(
+            get_state_store().snapshot(StreamStatus.UPCOMING), {}, live_streams, {}
+        )
+    new_ids = filter_events(events, EventKind.ADDED, status=StreamStatus.UPCOMING)
+    rescheduled_ids = filter_events(events, EventKind.RESCHEDULED)
+    title_changed_ids = filter_events(
+        events, EventKind.TITLE_CHANGED, status=StreamStatus.UPCOMING
+    )
+    ended_counter = len(
+        filter_events(events, EventKind.REMOVED, status=StreamStatus.UPCOMING)
+    )
 
-    new_label = '<span style="font-weight: bold; background-color: greenyellow; padding: 3px; margin: 4px; border-radius: 30%;">New!</span>'
+    rendered = render_streams(
+        live_streams,
+        StreamStatus.UPCOMING,
+        new_ids,
+        rescheduled_ids,
+        title_changed_ids,
+        now_=now_,
+    )
+    summary = filter_summary()
+    if rendered["new_counter"]:
+        summary.append(("blue", f"🆕 {rendered['new_counter']} New Live Streams"))
+    if rendered["soon_counter"]:
+        summary.append(
+            ("orange", f"💠 {rendered['soon_counter']} Live Streams will live soon!")
+        )
+    if rescheduled_ids:
+        summary.append(
+            ("#B8860B", f"🔁 {len(rescheduled_ids)} Live Streams rescheduled")
+        )
+    if ended_counter:
+        summary.append(
+            ("gray", f"⏹️ {ended_counter} Upcoming Live Streams started or removed")
+        )
+    summary.append(
+        ("#4B0082", f"📊 {rendered['total_streams']} Live Streams in total.")
+    )
 
-    prev_live_streams = {}
+    message = f"# `Total {FILTERS['Unarchived'].get('counter')} Unarchived Live Streams.\n` # 📹 Upcoming Unarchived YouTube Live Streams\n{rendered['message']}"
+    return {
+        "subject": subject,
+        "body": render_page(
+            "📹 Upcoming YouTube Live Streams",
+            render_summary(summary),
+            rendered["blocks"],
+        ),
+        "message": message,
+        "is_send": rendered["is_send"],
+        "soon_counter": rendered["soon_counter"],
+    }
 
-    total_streams = 0
 
-    new_counter = 0
-    for filters in FILTERS.items():
-        filters[1]["counter"] = 0
-    new_counter = 0
-    with open("./live_streams.json", "r", encoding="utf-8") as file:
-        prev_live_streams = json.load(file)
+def build_email_live(
+    live_streams: dict, events: list[StreamEvent] | None = None
+) -> dict:
+    """Subject, HTML body and Discord message of the live email."""
+    subject = f"{LIVE_SUBJECT} {format_date(int(time.time()))}"
 
-    for channel_id, info in live_streams.items():
-        if info["videos"]:
-            body += f"""
-                        <li style="list-style-type: none;">
-                            <img src="{info.get("avatar_url")}=s900-c-k-c0x00ffffff-no-rj" style="width: 60px; height: 60px; border-radius: 50%; margin-right: 4px;  display: inline-block;" />
-                            <strong style="font-size: 18px;">{info['channel_name']} ({channel_id})</strong> - <a href="{info['channel_url']}"><strong>Visit Channel</strong></a>
-                            <ul>
-                    """
-            for video in info["videos"]:
-                exists = True
-                if prev_live_streams != {}:
-                    try:
-                        if prev_live_streams.get(channel_id).get("videos") == []:
-                            exists = False
-                        else:
-                            exists = any(
-                                item["video_id"] == video["video_id"]
-                                for item in prev_live_streams.get(channel_id).get(
-                                    "videos", []
-                                )
-                            )
-                    except TypeError as e:
-                        print(f"ERROR: {e}")
-                        print(f"Channel_id at live: {channel_id}")
-
-                    new_counter = new_counter if exists else new_counter + 1
-
-                for filters in FILTERS.items():
-                    _filter = filters[1].get("filter", [])
-                    filters[1]["counter"], filters[1]["is_true"] = (
-                        count_title_description(
-                            filters[1]["counter"],
-                            video["title"],
-                            video["description"],
-                            _filter,
-                        )
-                    )
+    # events against the previous run (upcoming.json / live_streams.json)
+    if events is None:
+        events = diff_streams(
+            {}, get_state_store().snapshot(StreamStatus.LIVE), {}, live_streams
+        )
+    new_ids = filter_events(
+        events, EventKind.ADDED, EventKind.WENT_LIVE, status=StreamStatus.LIVE
+    )
+    title_changed_ids = filter_events(
+        events, EventKind.TITLE_CHANGED, status=StreamStatus.LIVE
+    )
+    ended_counter = len(
+        filter_events(events, EventKind.REMOVED, status=StreamStatus.LIVE)
+    )
 
-                total_streams += 1
-
-                if FILTERS["Unarchived"].get("is_true"):
-                    is_send = True
-                    if channel_id not in channel_lst:
-                        message += f"## {info['channel_name']} ({channel_id})\n---\n"
-                        channel_lst.append(channel_id)
-                    message += f"- Title: {video['title']}\n- Stream ID: [{video['video_id']}](https://www.youtube.com/watch?v={video['video_id']})\n---\n"
-
-                body += f"""
-                            <hr />
-                            <li style="list-style-type: none; {'color: red; font-weight: bold; font-style: oblique;' if FILTERS["Unarchived"].get("is_true") else ''}">
-                                <span><strong>🏷️ Title: </strong>{video['title']}</span> {"".join(filters[1].get("label", "") if filters[1].get("is_true", False) else "" for filters in FILTERS.items())} {"" if exists else new_label}
-                                <br />
-                                <span><strong>📝 Translated Title: </strong>{get_translated_title(video['title'], translate_title)}</span>
-                                <br />
-                                <span><strong>🆔 Stream ID: </strong><span style="font-weight: bold; font-family: consolas, 'Times New Roman', tahoma; font-size:x-large;">{video['video_id']}</span></span>
-                                <br />
-                                <span><strong>🖼️ Thumbnail: </strong> <img src="{video['thumbnail']}"/></span>
-                                <br />
-                                <a href="https://www.youtube.com/watch?v={video['video_id']}"><strong>▶️ Watch Stream</strong></a>
-                            </li>
-                        """
-                for filters in FILTERS.items():
-                    filters[1]["is_true"] = False
-            body += "</ul></li>"
-
-    body += "</ul></body></html>"
-    body_first = f"""<!DOCTYPE html>
-                <html>
-                <head>
-                    <meta charset="UTF-8">
-                </head>
-                <body>
-                <h1>🔴 YouTube Live Streams</h1>
-                <br />
-                {''.join(f'<h2 style="color: {filters[1].get("color", "green")}; font-weight: bold;">{filters[1].get("icon", "📣")} {filters[1].get("counter")} {filters[0]} Live Streams</h2>' if filters[1].get("counter") > 0 else "" for filters in FILTERS.items())}
-                {f'<h2 style="color: blue; font-weight: bold;">🆕 {new_counter} New Live Streams</h2>' if new_counter > 0 else ""}
-                {f'<h2 style="color: #4B0082; font-weight: bold;">📊 {total_streams} Live Streams in total.</h2>'}
-                <ul>
-            """
-    body = body_first + body
-    current_hash = md5(str(live_streams).encode("utf-8")).hexdigest()
+    rendered = render_streams(
+        live_streams, StreamStatus.LIVE, new_ids, title_changed_ids=title_changed_ids
+    )
+    summary = filter_summary()
+    if rendered["new_counter"]:
+        summary.append(("blue", f"🆕 {rendered['new_counter']} New Live Streams"))
+    if ended_counter:
+        summary.append(("gray", f"⏹️ {ended_counter} Live Streams ended"))
+    summary.append(
+        ("#4B0082", f"📊 {rendered['total_streams']} Live Streams in total.")
+    )
 
-    message = f"# `Total {FILTERS['Unarchived'].get('counter')} Unarchived Live Streams.`\n {message}"
+    message = f"# `Total {FILTERS['Unarchived'].get('counter')} Unarchived Live Streams.`\n # 🔴 Unarchived YouTube Live Streams\n{rendered['message']}"
+    return {
+        "subject": subject,
+        "body": render_page(
+            "🔴 YouTube Live Streams", render_summary(summary), rendered["blocks"]
+        ),
+        "message": message,
+        "is_send": rendered["is_send"],
+    }
 
-    is_exists = Path("./prev_hash_live.md5").exists()
-    if not is_exists:
-        print("create file")
-        with open("./prev_hash_live.md5", mode="w", encoding="utf-8") as file:
-            pass
 
-    with open("./prev_hash_live.md5", mode="r+", encoding="utf-8") as file:
-        prev_hash = file.readline().strip()
-        print_text(f"prev_live_hash: {prev_hash}")
-        print_text(f"curr_live_hash: {current_hash}")
-        if prev_hash != current_hash:
-            file.seek(0, 0)
-            file.write(current_hash)
-            send_email(subject, body)
-            if is_send:
-                send_discord_message(DISCORD_WEBHOOK_URL, message=message)
+def send_email_upcoming(
+    live_streams: dict, events: list[StreamEvent] | None = None
+) -> None:
+    with get_metrics().stage("render"):
+        email = build_email_upcoming(live_streams, events)
+    with get_metrics().stage("hash"):
+        channel_hashes = hash_channels(live_streams)
+    current_hash = combine_hashes(channel_hashes)
+
+    store = get_hash_store()
+    prev_hash = store.run_hash("upcoming")
+    changed = store.diff("upcoming", channel_hashes)
+    print_text(f"prev_upcoming_hash: {prev_hash}")
+    print_text(f"curr_upcoming_hash: {current_hash}")
+    if prev_hash != current_hash:
+        print_text(f"Changed upcoming channels: {', '.join(sorted(changed))}")
+        if email["is_send"]:
+            send_discord_message(DISCORD_WEBHOOK_URL, message=email["message"])
+        store.update("upcoming", channel_hashes)
+        send_email(email["subject"], email["body"])
+    else:
+        if email["soon_counter"]:
+            if email["is_send"]:
+                send_discord_message(DISCORD_WEBHOOK_URL, message=email["message"])
+            send_email(email["subject"], email["body"])
         else:
             print_text("Nothing changed!", "S")
 
 
-def get_info_livestream(channel_url: str):
-    Path("./temp").mkdir(parents=True, exist_ok=True)
-    original_cookies = Path("cookies.txt").absolute()
-    src_dir = original_cookies.parent
-    temp_dir = src_dir / "temp"
-    temp_dir = temp_dir.resolve()
-    temp_cookies_name = f"{uuid4().hex}.txt"
-    temp_cookies_path = temp_dir / temp_cookies_name
-    temp_cookies_path = temp_cookies_path.resolve()
-    shutil.copy(original_cookies, temp_cookies_path)
-    yt_opts = {
-        "extract_flat": True,
-        "skip_download": True,
-        "quiet": True,
-        "cookiefile": temp_cookies_path,
-        "verbose": False,
-    }
-    # "logger": logging.getLogger(), # in yt_opts
+def send_email_live(
+    live_streams: dict, events: list[StreamEvent] | None = None
+) -> None:
+    with get_metrics().stage("render"):
+        email = build_email_live(live_streams, events)
+    with get_metrics().stage("hash"):
+        channel_hashes = hash_channels(live_streams)
+    current_hash = combine_hashes(channel_hashes)
+
+    store = get_hash_store()
+    prev_hash = store.run_hash("live")
+    changed = store.diff("live", channel_hashes)
+    print_text(f"prev_live_hash: {prev_hash}")
+    print_text(f"curr_live_hash: {current_hash}")
+    if prev_hash != current_hash:
+        print_text(f"Changed live channels: {', '.join(sorted(changed))}")
+        store.update("live", channel_hashes)
+        send_email(email["subject"], email["body"])
+        if email["is_send"]:
+            send_discord_message(DISCORD_WEBHOOK_URL, message=email["message"])
+    else:
+        print_text("Nothing changed!", "S")
+
+
+YT_OPTS = {
+    "extract_flat": True,
+    "skip_download": True,
+    "quiet": True,
+    "verbose": False,
+}
+if STREAMS_MAX_ITEMS:
+    # only the first page(s) of the tab, entries are pulled lazily so yt-dlp
+    # stops paginating once it has enough
+    YT_OPTS.update(playlistend=STREAMS_MAX_ITEMS, lazy_playlist=True)
+# "logger": logging.getLogger(), # in YT_OPTS
+
+
+def parse_streams_result(channel_url: str, result: dict):
+    """Build the upcoming/live channels of one channel from a flat /streams result."""
     upcoming = {}
     live_streams = {}
-    avatar_url = ""
-    with yt_dlp.YoutubeDL(yt_opts) as ydl:
-        try:
-            if not channel_url.endswith("streams"):
-                live_url = channel_url + "/streams"
-            result = ydl.extract_info(live_url, download=False)
-            channel_id = result.get("uploader_id", channel_url.split("/")[-1])
-            print_text(f"Searching from channel: {channel_id}")
-            channel_name = result.get("channel")
-            videos_upcoming = []
-            videos_live = []
-            count = 0
-            for entry in result.get("entries", []):
-                if count > 10:
-                    break
-                title = entry.get("title", "")
-                status = entry.get("live_status", "")
-                thumbnail = entry.get("thumbnails")[-1].get("url")
-                description = entry.get("description")
-                if status == "is_upcoming":
-                    print_text("Found upcoming live stream!", prefix="S")
-                    print_text(f"Title: {title}", "T")
-                    video_id = entry.get("id")
-                    if video_id in SKIP_STREAMS:
-                        continue
-                    scheduled_time = entry.get("release_timestamp")
-                    tz = pytz.timezone("Asia/Ho_Chi_Minh")
-                    scheduled_time_readable = datetime.fromtimestamp(
-                        scheduled_time, tz
-                    ).strftime("%Y/%m/%d %H:%M:%S")
-                    scheduled_date = datetime.fromtimestamp(scheduled_time)
-                    current = datetime.now()
-                    delta = scheduled_date - current
-                    if delta.days > 10:
-                        continue
-                    videos_upcoming.append(
-                        {
-                            "video_id": video_id,
-                            "title": title,
-                            "date": scheduled_time_readable,
-                            "thumbnail": thumbnail,
-                            "description": description,
-                        }
-                    )
-                elif status == "is_live":
-                    print_text("Found live stream!", prefix="S")
-                    print_text(f"Title: {title}", "T")
-                    video_id = entry.get("id")
-                    if video_id in SKIP_STREAMS:
-                        continue
-                    videos_live.append(
-                        {
-                            "video_id": video_id,
-                            "title": title,
-                            "thumbnail": thumbnail,
-                            "description": description,
-                        }
-                    )
-                else:
-                    continue
-                count += 1
+    channel_id = result.get("uploader_id", channel_url.split("/")[-1])
+    print_text(f"Searching from channel: {channel_id}")
+    channel_name = result.get("channel")
+    videos_upcoming = []
+    videos_live = []
+    count = 0
+    entries = result.get("entries") or []
+    if STREAMS_MAX_ITEMS:
+        entries = itertools.islice(entries, STREAMS_MAX_ITEMS)
+    for entry in entries:
+        if count > 10:
+            break
+        status = StreamStatus.from_live_status(entry.get("live_status"))
+        if status is None:
+            continue
+        title = entry.get("title", "")
+        video_id = entry.get("id")
+        if status == StreamStatus.UPCOMING:
+            print_text("Found upcoming live stream!", prefix="S")
+        else:
+            print_text("Found live stream!", prefix="S")
+        print_text(f"Title: {title}", "T")
+        if video_id in SKIP_STREAMS:
+            continue
+        video = Video(
+            video_id=video_id,
+            title=title,
+            status=status,
+            thumbnail=entry.get("thumbnails")[-1].get("url"),
+            description=entry.get("description"),
+        )
+        if status == StreamStatus.UPCOMING:
+            video.scheduled_at = entry.get("release_timestamp")
+            if (
+                video.scheduled_at is not None
+                and timedelta(seconds=video.scheduled_at - time.time()).days > 10
+            ):
+                continue
+            videos_upcoming.append(video)
+        else:
+            videos_live.append(video)
+        count += 1
 
-            with open("./vtuber.json", "r", encoding="utf-8") as file:
-                raw_data = json.load(file)
-                avatar_url = raw_data.get(channel_id, "@dooby3d").get(
-                    "avatar_url",
-                    "https://yt3.googleusercontent.com/U3KyLvyQRzOrgRHZYEYPQCc1QS2Jx5LnQF_5H6aYDluVM8AOnAZ90U0tSY3aVobgVNlRccieDA",
-                )
+    avatar_url = get_registry().avatar_url(channel_id, channel_url)
 
-            upcoming[channel_id] = {
-                "channel_url": channel_url,
-                "channel_name": channel_name,
-                "avatar_url": avatar_url,
-                "videos": videos_upcoming,
-            }
-            live_streams[channel_id] = {
-                "channel_url": channel_url,
-                "channel_name": channel_name,
-                "avatar_url": avatar_url,
-                "videos": videos_live,
-            }
-        except Exception as e:
-            print_text(f"Failed to fetch data for {channel_url}: {e}", prefix="E")
+    upcoming[channel_id] = Channel(
+        channel_url, channel_name, avatar_url, videos_upcoming
+    )
+    live_streams[channel_id] = Channel(
+        channel_url, channel_name, avatar_url, videos_live
+    )
+
+    return upcoming, live_streams
+
+
+def get_info_livestream(
+    channel_url: str,
+    pool: YoutubeDLPool | None = None,
+    probe: ChannelProbe | None = None,
+):
+    """
+    Upcoming/live channels of one channel, paced by the fetch governor.
+    Empty dicts when it failed or its circuit is open (the channel is unknown).
+    """
+    governor = get_fetch_governor()
+    if not governor.allow(channel_url):
+        print_text(f"Circuit open for {channel_url}, keeping its previous state", "W")
+        get_metrics().channel(channel_url, 0.0, False, "circuit open")
+        if probe is not None:
+            probe.forget(channel_url)
+        return {}, {}
+    own_pool = pool is None
+    if own_pool:
+        pool = YoutubeDLPool(YT_OPTS, CookieStore.load())
+    upcoming = {}
+    live_streams = {}
+    ydl = pool.get()
+    start = time.perf_counter()
+    start_bytes = getattr(ydl, "downloaded_bytes", 0)
+    live_url = channel_url
+    if not channel_url.endswith("streams"):
+        live_url = channel_url + "/streams"
+    try:
+        for attempt in range(FETCH_RETRIES + 1):
+            governor.acquire()
+            try:
+                result = ydl.extract_info(live_url, download=False)
+                break
+            except Exception as e:
+                governor.observe(e)
+                if attempt == FETCH_RETRIES:
+                    raise
+                delay = governor.backoff(attempt)
+                print_text(f"Retrying {channel_url} in {delay:.0f}s: {e}", "W")
+                time.sleep(delay)
+        upcoming, live_streams = parse_streams_result(channel_url, result)
+        if probe is not None:
+            probe.remember(channel_url, result.get("channel_id"))
+        get_metrics().channel(
+            channel_url,
+            time.perf_counter() - start,
+            True,
+            bytes_=getattr(ydl, "downloaded_bytes", 0) - start_bytes,
+        )
+        governor.success(channel_url)
+    except Exception as e:
+        print_text(f"Failed to fetch data for {channel_url}: {e}", prefix="E")
+        get_metrics().channel(
+            channel_url,
+            time.perf_counter() - start,
+            False,
+            str(e),
+            getattr(ydl, "downloaded_bytes", 0) - start_bytes,
+        )
+        governor.failure(channel_url, e)
+        if probe is not None:
+            probe.forget(channel_url)
+    finally:
+        if own_pool:
+            pool.close()
 
     upcoming = sort_obj(upcoming)
     live_streams = sort_obj(live_streams)
@@ -786,18 +2850,46 @@ def get_info_livestream(channel_url: str):
     return upcoming, live_streams
 
 
-def process_channels(channel_urls: list[str], max_workers=5):
+def process_channels(
+    channel_urls: list[str],
+    max_workers=5,
+    cookies: CookieStore | None = None,
+    probe: ChannelProbe | None = None,
+    result_queue: queue.Queue | None = None,
+    pool: YoutubeDLPool | None = None,
+):
     upcoming_all = {}
     live_streams_all = {}
+    if cookies is None:
+        cookies = CookieStore.load()
+    if pool is None:
+        pool = YoutubeDLPool(YT_OPTS, cookies)
+    busy = [0.0]  # seconds the workers spent inside get_info_livestream
+    started = [0]
+    lock = threading.Lock()
+
+    def fetch(url: str):
+        with lock:
+            started[0] += 1
+        start = time.perf_counter()
+        try:
+            return get_info_livestream(url, pool, probe)
+        finally:
+            with lock:
+                busy[0] += time.perf_counter() - start
+
+    queue_depths = []  # channels still waiting for a worker, at each completion
+    wall = time.perf_counter()
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_url = {
-            executor.submit(get_info_livestream, url): url for url in channel_urls
-        }
+        future_to_url = {executor.submit(fetch, url): url for url in channel_urls}
 
         for future in as_completed(future_to_url):
             url = future_to_url[future]
+            queue_depths.append(len(future_to_url) - started[0])
             try:
                 upcoming, live_streams = future.result()
+                if result_queue is not None:
+                    result_queue.put((upcoming, live_streams))
                 for channel_id, data in upcoming.items():
                     upcoming_all[channel_id] = data
                 for channel_id, data in live_streams.items():
@@ -805,48 +2897,841 @@ def process_channels(channel_urls: list[str], max_workers=5):
             except Exception as e:
                 print_text(f"Error processing {url}: {e}", "E")
 
+    get_metrics().fetch_pool(
+        max_workers, time.perf_counter() - wall, busy[0], queue_depths
+    )
+    pool.close()
+    cookies.save()
+    print_text(pool.stats())
+
     upcoming_all = sort_obj(upcoming_all)
     live_streams_all = sort_obj(live_streams_all)
 
     return upcoming_all, live_streams_all
 
 
-def main():
-    # os.system('cls' if os.name=='nt' else 'clear')
-    print(f"You are in {ENV} environment!")
-    start = datetime.now(pytz.timezone("Asia/Ho_Chi_Minh"))
-    channel_urls = get_channel_url("channel_url.txt")
-    upcoming, live_streams = process_channels(channel_urls, 10)
+def get_yt_text(obj: dict | None) -> str:
+    if not obj:
+        return ""
+    if "simpleText" in obj:
+        return obj["simpleText"]
+    return "".join(run.get("text", "") for run in obj.get("runs", []))
+
 
-    send_email_upcoming(upcoming)
-    send_email_live(live_streams)
+def iter_video_renderers(node):
+    """Yield every videoRenderer of ytInitialData in page order."""
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key == "videoRenderer":
+                yield value
+            else:
+                yield from iter_video_renderers(value)
+    elif isinstance(node, list):
+        for item in node:
+            yield from iter_video_renderers(item)
+
+
+def extract_streams_page(html: str, channel_url: str) -> dict:
+    """
+    Parse the ytInitialData of a /streams page into the same flat shape as
+    yt-dlp extract_info(extract_flat=True). Runs in the parse executor.
+    """
+    marker = html.find("ytInitialData = ")
+    if marker == -1:
+        marker = html.find('ytInitialData"] = ')
+    if marker == -1:
+        raise ValueError("ytInitialData not found (consent page or bad cookies?)")
+    data, _ = json.JSONDecoder().raw_decode(html, html.index("{", marker))
+
+    metadata = data.get("metadata", {}).get("channelMetadataRenderer", {})
+    vanity_url = metadata.get("vanityChannelUrl") or ""
+    handle = vanity_url.rsplit("/", 1)[-1]
+    entries = []
+    for renderer in iter_video_renderers(data.get("contents", {})):
+        scheduled = renderer.get("upcomingEventData", {}).get("startTime")
+        overlay_styles = [
+            overlay.get("thumbnailOverlayTimeStatusRenderer", {}).get("style")
+            for overlay in renderer.get("thumbnailOverlays", [])
+        ]
+        badge_styles = [
+            badge.get("metadataBadgeRenderer", {}).get("style")
+            for badge in renderer.get("badges", [])
+        ]
+        if scheduled is not None:
+            live_status = "is_upcoming"
+        elif "LIVE" in overlay_styles or "BADGE_STYLE_TYPE_LIVE_NOW" in badge_styles:
+            live_status = "is_live"
+        else:
+            live_status = None
+        entries.append(
+            {
+                "id": renderer.get("videoId"),
+                "title": get_yt_text(renderer.get("title")),
+                "description": get_yt_text(renderer.get("descriptionSnippet")),
+                "thumbnails": renderer.get("thumbnail", {}).get("thumbnails", []),
+                "live_status": live_status,
+                "release_timestamp": int(scheduled) if scheduled is not None else None,
+            }
+        )
 
-    with open("./live_streams.json", mode="w", encoding="utf-8") as file:
-        json.dump(live_streams, file, ensure_ascii=False, indent=4)
-        print_text("Saved in to live_streams.json", "S")
+    return {
+        "uploader_id": handle if handle.startswith("@") else channel_url.split("/")[-1],
+        "channel_id": metadata.get("externalId"),
+        "channel": metadata.get("title"),
+        "entries": entries,
+    }
 
-    with open("./upcoming.json", mode="w", encoding="utf-8") as file:
-        json.dump(upcoming, file, ensure_ascii=False, indent=4)
-        print_text("Saved in to upcoming.json", "S")
 
-    end = datetime.now(pytz.timezone("Asia/Ho_Chi_Minh"))
-    delta = end - start
-    with open("./time-run.txt", "a", encoding="utf-8") as file:
-        file.write(
-            f"{start.strftime('%Y/%m/%d-%H:%M:%S')} ::: Script ran {pretty_time_delta(delta)} ({delta.total_seconds()} seconds)\n"
+async def process_channels_async(
+    channel_urls: list[str],
+    concurrency: int = FETCH_CONCURRENCY,
+    cookies: CookieStore | None = None,
+    parse_workers: int = PARSE_WORKERS,
+    probe: ChannelProbe | None = None,
+    result_queue: queue.Queue | None = None,
+):
+    """
+    Download every /streams page concurrently (bounded by a semaphore) and
+    parse them in a small process pool. Same result as process_channels.
+    """
+    import asyncio
+
+    import aiohttp
+
+    upcoming_all = {}
+    live_streams_all = {}
+    if cookies is None:
+        cookies = CookieStore.load()
+    headers = {
+        "User-Agent": USER_AGENT,
+        "Accept-Language": "en-US,en;q=0.9",
+        "Cookie": cookies.header(),
+    }
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+    governor = get_fetch_governor()
+    busy = [0.0]  # seconds spent downloading inside the semaphore
+    started = [0]
+    queue_depths = []  # channels still waiting for a slot, at each completion
+    wall = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=parse_workers) as executor:
+        async with aiohttp.ClientSession(
+            headers=headers, timeout=aiohttp.ClientTimeout(total=60)
+        ) as session:
+
+            async def download(live_url: str) -> str:
+                for attempt in range(FETCH_RETRIES + 1):
+                    await asyncio.sleep(governor.reserve())
+                    try:
+                        async with session.get(live_url) as response:
+                            response.raise_for_status()
+                            return await response.text()
+                    except Exception as e:
+                        governor.observe(e)
+                        if attempt == FETCH_RETRIES:
+                            raise
+                        await asyncio.sleep(governor.backoff(attempt))
+
+            async def fetch_one(channel_url: str):
+                if not governor.allow(channel_url):
+                    started[0] += 1
+                    # reported like the thread engine does
+                    get_metrics().channel(channel_url, 0.0, False, "circuit open")
+                    raise RuntimeError("circuit open")
+                live_url = channel_url
+                if not channel_url.endswith("streams"):
+                    live_url = channel_url + "/streams"
+                async with semaphore:
+                    started[0] += 1
+                    start = time.perf_counter()
+                    try:
+                        html = await download(live_url)
+                    except Exception as e:
+                        get_metrics().channel(
+                            channel_url, time.perf_counter() - start, False, str(e)
+                        )
+                        raise
+                    finally:
+                        busy[0] += time.perf_counter() - start
+                        queue_depths.append(len(channel_urls) - started[0])
+                    get_metrics().channel(
+                        channel_url,
+                        time.perf_counter() - start,
+                        True,
+                        bytes_=len(html.encode("utf-8")),
+                    )
+                result = await loop.run_in_executor(
+                    executor, extract_streams_page, html, channel_url
+                )
+                parsed = parse_streams_result(channel_url, result)
+                if probe is not None:
+                    probe.remember(channel_url, result.get("channel_id"))
+                if result_queue is not None:
+                    result_queue.put(parsed)
+                return parsed
+
+            results = await asyncio.gather(
+                *(fetch_one(url) for url in channel_urls), return_exceptions=True
+            )
+
+    get_metrics().fetch_pool(
+        concurrency, time.perf_counter() - wall, busy[0], queue_depths
+    )
+
+    for url, result in zip(channel_urls, results):
+        if isinstance(result, Exception):
+            print_text(f"Failed to fetch data for {url}: {result}", prefix="E")
+            if url not in governor.unknown:  # not skipped by its circuit
+                governor.failure(url, result)
+            if probe is not None:
+                probe.forget(url)
+            continue
+        governor.success(url)
+        upcoming, live_streams = result
+        upcoming_all.update(upcoming)
+        live_streams_all.update(live_streams)
+
+    upcoming_all = sort_obj(upcoming_all)
+    live_streams_all = sort_obj(live_streams_all)
+
+    return upcoming_all, live_streams_all
+
+
+def load_snapshot(path: str | Path) -> dict:
+    if not Path(path).exists():
+        return {}
+    with open(path, mode="r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def fetch_channels(
+    channel_urls: list[str],
+    cookies: CookieStore | None = None,
+    mode: str = FETCH_MODE,
+    probe: ChannelProbe | None = None,
+    result_queue: queue.Queue | None = None,
+):
+    """
+    Run the fetch engine selected by FETCH_MODE. With a probe, channels that
+    did not change keep their previous snapshot and skip the full extraction.
+    Each fetched channel is also put on result_queue as soon as it is done.
+    """
+    carried_upcoming = {}
+    carried_live = {}
+    total = len(channel_urls)
+    prev_upcoming = get_state_store().snapshot(StreamStatus.UPCOMING)
+    prev_live = get_state_store().snapshot(StreamStatus.LIVE)
+    if probe is not None:
+        channel_urls, carried_upcoming, carried_live = probe.select(
+            channel_urls, prev_upcoming, prev_live
         )
+
+    if mode == "async":
+        import asyncio
+
+        upcoming, live_streams = asyncio.run(
+            process_channels_async(
+                channel_urls, cookies=cookies, probe=probe, result_queue=result_queue
+            )
+        )
+    else:
+        if mode != "thread":
+            print_text(f"Unknown FETCH_MODE {mode}, using thread mode", "W")
+        upcoming, live_streams = process_channels(
+            channel_urls, 10, cookies, probe, result_queue
+        )
+
+    if probe is not None:
+        print_text(f"Probe skipped {probe.skipped}/{total} full extractions", "S")
+
+    # a failed channel is unknown, not "every stream ended"
+    governor = get_fetch_governor()
+    unknown = governor.unknown.keys() & set(channel_urls)
+    if unknown:
+        for snapshot, carried in (
+            (prev_upcoming, carried_upcoming),
+            (prev_live, carried_live),
+        ):
+            for channel_id, info in snapshot.items():
+                if info.channel_url in unknown:
+                    carried[channel_id] = info
+        print_text(
+            f"{len(unknown)} channels unknown, keeping their previous state: "
+            + ", ".join(sorted(url.rsplit("/", 1)[-1] for url in unknown)),
+            "W",
+        )
+    print_text(governor.stats())
+    if carried_upcoming or carried_live:
+        upcoming = sort_obj({**carried_upcoming, **upcoming})
+        live_streams = sort_obj({**carried_live, **live_streams})
+
+    return upcoming, live_streams
+
+
+def tracked_channel(channel_data: dict) -> Channel:
+    """Channel of vtuber.json without videos."""
+    return Channel.from_dict(channel_skeleton(channel_data), StreamStatus.UPCOMING)
+
+
+def sync_tracked_channels() -> bool:
+    """
+    Limit the previous snapshots to the channels of vtuber.json (what
+    load-json.py used to do on the JSON files). Writes only on change.
+    """
+    store = get_state_store()
+    upcoming = store.snapshot(StreamStatus.UPCOMING)
+    live_streams = store.snapshot(StreamStatus.LIVE)
+    if not merge_tracked_channels(
+        get_registry(), upcoming, live_streams, skeleton=tracked_channel
+    ):
+        return False
+    store.save_run(sort_obj(upcoming), sort_obj(live_streams))
+    print_text("Synced the tracked channels of vtuber.json", "S")
+    return True
+
+
+def run_record(
+    start: datetime,
+    end: datetime,
+    channel_count: int,
+    upcoming: dict,
+    live_streams: dict,
+) -> dict:
+    """Row of the runs table."""
+    return {
+        "started_at": start.strftime("%Y/%m/%d-%H:%M:%S"),
+        "seconds": (end - start).total_seconds(),
+        "channels": channel_count,
+        "upcoming": sum(len(info.videos) for info in upcoming.values()),
+        "live": sum(len(info.videos) for info in live_streams.values()),
+    }
+
+
+def save_snapshots(
+    upcoming: dict,
+    live_streams: dict,
+    run: dict | None = None,
+    probe: dict | None = None,
+) -> None:
+    """Snapshots, notification hashes, probe state and the run record, in one transaction."""
+    store = get_state_store()
+    store.save_run(
+        upcoming,
+        live_streams,
+        get_hash_store().state,
+        run,
+        get_fetch_governor().health,
+        probe,
+    )
+    print_text(f"Saved in to {store.path}", "S")
+
+
+def get_poll_interval(upcoming_info: Channel | None, live_info: Channel | None) -> int:
+    """Seconds until the next poll of a channel, based on its current state."""
+    if live_info and live_info.videos:
+        return DAEMON_INTERVALS["live"]
+    if not upcoming_info or not upcoming_info.videos:
+        return DAEMON_INTERVALS["idle"]
+
+    now_ = time.time()
+    nearest = min(
+        (
+            video.scheduled_at - now_
+            for video in upcoming_info.videos
+            if video.scheduled_at is not None
+        ),
+        default=float("inf"),
+    )
+    if nearest <= LIMIT * 60:
+        return DAEMON_INTERVALS["soon"]
+    # wake up right when the stream enters the LIMIT window
+    return int(
+        min(
+            DAEMON_INTERVALS["upcoming"],
+            max(DAEMON_INTERVALS["soon"], nearest - LIMIT * 60),
+        )
+    )
+
+
+def run_daemon(channel_urls: list[str], max_workers: int = 10) -> None:
+    """
+    Stay resident and poll every channel on its own schedule (priority queue
+    keyed by the next poll time). Notifications run whenever the state changes.
+    """
+    print_text(f"Watching {len(channel_urls)} channels, press Ctrl+C to stop", "S")
+    sync_tracked_channels()
+    cookies = CookieStore.load()
+    pool = YoutubeDLPool(YT_OPTS, cookies)
+    upcoming = get_state_store().snapshot(StreamStatus.UPCOMING)
+    live_streams = get_state_store().snapshot(StreamStatus.LIVE)
+    channel_of = {}  # channel_url -> channel_id
+    for channel_id, info in upcoming.items():
+        channel_of[info.channel_url] = channel_id
+
+    schedule = [(time.time(), channel_url) for channel_url in channel_urls]
+    heapq.heapify(schedule)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while schedule:
+                now = time.time()
+                if schedule[0][0] > now:
+                    time.sleep(min(schedule[0][0] - now, 30))
+                    continue
+
+                due = []
+                while schedule and schedule[0][0] <= now:
+                    due.append(heapq.heappop(schedule)[1])
+
+                # every cycle is reported and recorded as its own run
+                reset_metrics()
+                started_at = datetime.now(TIMEZONE)
+                changed = False
+                with get_metrics().stage("fetch"):
+                    results = list(
+                        executor.map(
+                            lambda channel_url: get_info_livestream(channel_url, pool),
+                            due,
+                        )
+                    )
+                for channel_url, (new_upcoming, new_live) in zip(due, results):
+                    if not new_upcoming:
+                        # unknown: keep the previous state and retry later
+                        retry_at = max(
+                            now + DAEMON_INTERVALS["upcoming"],
+                            get_fetch_governor().next_attempt(channel_url),
+                        )
+                        heapq.heappush(schedule, (retry_at, channel_url))
+                        continue
+                    for channel_id, info in new_upcoming.items():
+                        channel_of[channel_url] = channel_id
+                        if upcoming.get(channel_id) != info:
+                            upcoming[channel_id] = info
+                            changed = True
+                    for channel_id, info in new_live.items():
+                        if live_streams.get(channel_id) != info:
+                            live_streams[channel_id] = info
+                            changed = True
+                    channel_id = channel_of[channel_url]
+                    interval = get_poll_interval(
+                        upcoming.get(channel_id), live_streams.get(channel_id)
+                    )
+                    heapq.heappush(schedule, (now + interval, channel_url))
+
+                if changed:
+                    upcoming = sort_obj(upcoming)
+                    live_streams = sort_obj(live_streams)
+                    with get_metrics().stage("translate"):
+                        translate_titles(upcoming, live_streams)
+                    events = get_stream_events(upcoming, live_streams)
+                    send_email_upcoming(upcoming, events)
+                    send_email_live(live_streams, events)
+                    save_snapshots(
+                        upcoming,
+                        live_streams,
+                        run=run_record(
+                            started_at,
+                            datetime.now(TIMEZONE),
+                            len(due),
+                            upcoming,
+                            live_streams,
+                        ),
+                    )
+                    get_title_cache().flush()
+                    get_render_cache().save()
+                    get_metrics().write()
+                else:
+                    # a quiet cycle is still a run: is_first_run and the
+                    # run history must see it
+                    get_state_store().record_run(
+                        run_record(
+                            started_at,
+                            datetime.now(TIMEZONE),
+                            len(due),
+                            upcoming,
+                            live_streams,
+                        )
+                    )
+                print_text(
+                    f"Polled {len(due)} channels, next poll in {int(schedule[0][0] - time.time())}s"
+                )
+    except KeyboardInterrupt:
+        print_text("Stopping daemon...", "W")
+    finally:
+        pool.close()
+        cookies.save()
+
+
+LAZY_MODULES = (
+    "yt_dlp",
+    "deep_translator",
+    "inflect",
+    "requests",
+    "email.mime.multipart",
+    "smtplib",
+    "asyncio",
+    "aiohttp",
+)
+
+
+def profile_startup(top: int = 15) -> None:
+    """
+    Import main.py in a fresh interpreter with -X importtime, then each
+    dependency it loads on demand, and print the import time per module.
+    """
+    code = (
+        "import main\n"
+        f"for name in {LAZY_MODULES!r}:\n"
+        "    try:\n"
+        "        __import__(name)\n"
+        "    except ImportError:\n"
+        "        pass\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=Path(__file__).resolve().parent,
+        capture_output=True,
+        text=True,
+    )
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        # nested imports are indented by two spaces per level
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((depth, int(cumulative) / 1000, name.strip()))
+    roots = [index for index, (depth, _, _) in enumerate(entries) if depth == 0]
+    main_index = next((index for index in roots if entries[index][2] == "main"), None)
+    if main_index is None:
+        print_text(f"Unable to import main:\n{result.stderr[-2000:]}", "E")
+        return
+    # direct imports of main are printed right before it
+    first = max([index + 1 for index in roots if index < main_index], default=0)
+    startup = [
+        (ms, name) for depth, ms, name in entries[first:main_index] if depth == 1
+    ]
+    on_demand = [
+        (ms, name) for depth, ms, name in entries[main_index + 1 :] if depth == 0
+    ]
+
+    print_text(f"import main: {entries[main_index][1]:.1f} ms", "T")
+    for ms, name in sorted(startup, reverse=True)[:top]:
+        print(f"{ms:10.1f} ms  {name}")
     print_text(
-        f"Done at {datetime.now(pytz.timezone('Asia/Ho_Chi_Minh')).strftime('%d/%m/%Y %H:%M:%S')}",
+        f"Loaded on demand: {sum(ms for ms, _ in on_demand):.1f} ms "
+        "(modules already loaded by an earlier one are not listed)",
+        "T",
+    )
+    for ms, name in on_demand:
+        print(f"{ms:10.1f} ms  {name}")
+
+
+def shard_of(channel_url: str, total: int) -> int:
+    """Stable partition of a channel, the same on every runner and every run."""
+    digest = md5(normalize_channel_url(channel_url).encode("utf-8")).hexdigest()
+    return int(digest, 16) % total
+
+
+def shard_path(index: int, total: int) -> Path:
+    return Path(SHARD_DIR, f"shard-{index}-of-{total}.json")
+
+
+def parse_shard(value: str) -> tuple[int, int]:
+    """Parse --shard "i/N" into (index, total), with 0 <= index < total."""
+    try:
+        index, total = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected i/N, got {value!r}")
+    if total < 1 or not 0 <= index < total:
+        raise argparse.ArgumentTypeError(f"shard {value} out of range")
+    return index, total
+
+
+def run_shard(index: int, total: int) -> None:
+    """
+    Fetch only the channels of one shard and write them as a partial snapshot.
+    Notifications and state.db writes are left to the merge step.
+    """
+    print(f"You are in {ENV} environment! (shard {index}/{total})")
+    start = time.monotonic()
+    channel_urls = [
+        channel_url
+        for channel_url in get_channel_url("channel_url.txt")
+        if shard_of(channel_url, total) == index
+    ]
+    # the probe state goes back to state.db through the merge step
+    probe = ChannelProbe(get_state_store().probe()) if PROBE_CHANNELS else None
+    Path(SHARD_DIR).mkdir(exist_ok=True)
+    with get_metrics().stage("fetch"):
+        upcoming, live_streams = fetch_channels(channel_urls, probe=probe)
+
+    path = shard_path(index, total)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, mode="w", encoding="utf-8") as file:
+        json.dump(
+            {
+                "shard": index,
+                "total": total,
+                "seconds": time.monotonic() - start,
+                "channel_urls": channel_urls,
+                "upcoming": snapshot_to_json(upcoming),
+                "live_streams": snapshot_to_json(live_streams),
+                "channels": get_metrics().report()["channels"],
+                "unknown": get_fetch_governor().unknown,
+                "health": {
+                    channel_url: value
+                    for channel_url, value in get_fetch_governor().health.items()
+                    if channel_url in channel_urls
+                },
+                "probe": probe.entries(channel_urls) if probe is not None else {},
+            },
+            file,
+            ensure_ascii=False,
+        )
+    os.replace(tmp_path, path)
+    print_text(f"Shard {index}/{total}: {len(channel_urls)} channels -> {path}", "S")
+
+
+def merge_shards(total: int) -> tuple[dict, dict, list[str], dict]:
+    """
+    Combine the partial snapshots (and probe states) of every shard in shard
+    order. Channels of a missing shard keep their previous state, consumed
+    files are removed.
+    """
+    upcoming = {}
+    live_streams = {}
+    channel_urls = []
+    probe = {}
+    fetch_seconds = 0.0
+    store = get_state_store()
+    for index in range(total):
+        path = shard_path(index, total)
+        if not path.exists():
+            print_text(
+                f"Shard {index}/{total} missing, keeping its previous state", "W"
+            )
+            for snapshot, previous in (
+                (upcoming, store.snapshot(StreamStatus.UPCOMING)),
+                (live_streams, store.snapshot(StreamStatus.LIVE)),
+            ):
+                for channel_id, info in previous.items():
+                    if shard_of(info.channel_url or "", total) == index:
+                        snapshot[channel_id] = info
+            continue
+        with open(path, mode="r", encoding="utf-8") as file:
+            shard = json.load(file)
+        if shard["total"] != total:
+            raise ValueError(f"{path} belongs to a {shard['total']} shard run")
+        upcoming.update(snapshot_from_json(shard["upcoming"], StreamStatus.UPCOMING))
+        live_streams.update(
+            snapshot_from_json(shard["live_streams"], StreamStatus.LIVE)
+        )
+        channel_urls += shard["channel_urls"]
+        governor = get_fetch_governor()
+        for channel_url in shard["channel_urls"]:
+            governor.health.pop(channel_url, None)
+        governor.health.update(shard["health"])
+        governor.unknown.update(shard["unknown"])
+        probe.update(shard.get("probe", {}))
+        fetch_seconds = max(fetch_seconds, shard["seconds"])
+        for info in shard["channels"]:
+            get_metrics().channel(
+                info["url"], info["seconds"], info["ok"], info["error"], info["bytes"]
+            )
+        path.unlink()
+    # the slowest shard is the fetch time of the whole run
+    get_metrics().stages["fetch"] = [fetch_seconds, total]
+    return sort_obj(upcoming), sort_obj(live_streams), channel_urls, probe
+
+
+def run_local_shards(total: int) -> None:
+    """
+    Run every shard as its own process, the way a CI matrix would. They share
+    one IP, so FETCH_RATE and FETCH_BURST are split between them.
+    """
+    env = {
+        **os.environ,
+        "FETCH_RATE": str(FETCH_RATE / total),
+        "FETCH_BURST": str(max(1, FETCH_BURST // total)),
+    }
+    processes = [
+        subprocess.Popen(
+            [sys.executable, __file__, "--shard", f"{index}/{total}"],
+            stdout=subprocess.DEVNULL,
+            env=env,
+        )
+        for index in range(total)
+    ]
+    for index, process in enumerate(processes):
+        if process.wait() != 0:
+            print_text(f"Shard {index}/{total} exited with {process.returncode}", "E")
+
+
+def notify_and_save(
+    upcoming: dict,
+    live_streams: dict,
+    start: datetime,
+    channel_count: int,
+    probe: dict | None = None,
+) -> None:
+    """Everything after the fetch: translation, notifications, state and metrics."""
+    with get_metrics().stage("translate"):
+        translate_titles(upcoming, live_streams)
+
+    events = get_stream_events(upcoming, live_streams)
+    send_email_upcoming(upcoming, events)
+    send_email_live(live_streams, events)
+
+    end = datetime.now(TIMEZONE)
+    delta = end - start
+    save_snapshots(
+        upcoming,
+        live_streams,
+        run=run_record(start, end, channel_count, upcoming, live_streams),
+        probe=probe,
+    )
+    print_text(f"Script ran {short_time_delta(delta)}", "S")
+    print_text(get_metrics().summary())
+    get_metrics().write()
+    get_title_cache().flush()
+    print_text(get_title_cache().stats())
+    get_render_cache().save()
+    print_text(get_render_cache().stats())
+    print_text(
+        f"Done at {datetime.now(TIMEZONE).strftime('%d/%m/%Y %H:%M:%S')}",
         prefix="S",
     )
+
+
+def main(stream: bool = STREAM_NOTIFY):
+    # os.system('cls' if os.name=='nt' else 'clear')
+    print(f"You are in {ENV} environment!")
+    start = datetime.now(TIMEZONE)
+    channel_urls = get_channel_url("channel_url.txt")
+    sync_tracked_channels()
+    probe = ChannelProbe(get_state_store().probe()) if PROBE_CHANNELS else None
+    notifier = None
+    if stream:
+        notifier = UrgentNotifier(
+            get_state_store().snapshot(StreamStatus.UPCOMING),
+            get_state_store().snapshot(StreamStatus.LIVE),
+        ).start()
+    try:
+        with get_metrics().stage("fetch"):
+            upcoming, live_streams = fetch_channels(
+                channel_urls,
+                probe=probe,
+                result_queue=notifier.queue if notifier else None,
+            )
+    finally:
+        if notifier is not None:
+            notifier.close()
+            print_text(f"Sent {notifier.sent} urgent notifications while fetching")
+    notify_and_save(
+        upcoming,
+        live_streams,
+        start,
+        len(channel_urls),
+        probe.entries() if probe is not None else None,
+    )
     time.sleep(5)
 
 
+def main_merge(total: int, local: bool = False) -> None:
+    """Merge step of a sharded run, optionally running the shards first."""
+    print(f"You are in {ENV} environment!")
+    start = datetime.now(TIMEZONE)
+    sync_tracked_channels()
+    if local:
+        run_local_shards(total)
+    upcoming, live_streams, channel_urls, probe = merge_shards(total)
+    print_text(f"Merged {total} shards: {len(channel_urls)} channels", "S")
+    notify_and_save(upcoming, live_streams, start, len(channel_urls), probe)
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="stay resident and poll channels on an adaptive schedule",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        default=STREAM_NOTIFY,
+        help="send urgent events while channels are still being fetched",
+    )
+    parser.add_argument(
+        "--export",
+        metavar="DIR",
+        nargs="?",
+        const=".",
+        help="write upcoming.json, live_streams.json, hashes.json and time-run.txt from state.db and exit",
+    )
+    shard_group = parser.add_mutually_exclusive_group()
+    shard_group.add_argument(
+        "--shard",
+        metavar="i/N",
+        type=parse_shard,
+        help="fetch only shard i of N and write a partial snapshot in shards/",
+    )
+    shard_group.add_argument(
+        "--merge",
+        metavar="N",
+        type=int,
+        help="merge the N partial snapshots, then notify and save",
+    )
+    shard_group.add_argument(
+        "--local-shards",
+        metavar="N",
+        type=int,
+        help="run N shard processes locally, then merge them",
+    )
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="report the import time of each module at startup and exit",
+    )
+    args = parser.parse_args()
+    for option, value in (
+        ("--merge", args.merge),
+        ("--local-shards", args.local_shards),
+    ):
+        if value is not None and value < 1:
+            parser.error(f"{option} expects at least 1 shard, got {value}")
+
+    if args.profile_startup:
+        profile_startup()
+        raise SystemExit(0)
+
+    if args.shard:
+        run_shard(*args.shard)
+        raise SystemExit(0)
+
+    if args.export:
+        get_state_store().export(args.export)
+        get_state_store().close()
+        raise SystemExit(0)
+
     init_db()
-    main()
+    if args.daemon:
+        print(f"You are in {ENV} environment!")
+        run_daemon(get_channel_url("channel_url.txt"))
+    elif args.merge is not None:
+        main_merge(args.merge)
+    elif args.local_shards is not None:
+        main_merge(args.local_shards, local=True)
+    else:
+        main(stream=args.stream)
     clean_up_old_titles()
-    try:
-        shutil.rmtree("./temp")
-    except OSError as e:
-        print("Error: %s - %s." % (e.filename, e.strerror))
+    get_title_cache().close()
+    get_state_store().clean_up()
+    get_state_store().close()
+    if mail_transport is not None:
+        print_text(mail_transport.stats())
+        mail_transport.close()
+    for webhook in discord_webhooks.values():
+        webhook.close()
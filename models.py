@@ -0,0 +1,109 @@
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from enum import StrEnum
+
+DATE_FORMAT = "%Y/%m/%d %H:%M:%S"
+# the only timezone of the project (schedules, run times, subjects):
+# Asia/Ho_Chi_Minh has been UTC+7 without daylight saving time since 1975
+TIMEZONE = timezone(timedelta(hours=7), "Asia/Ho_Chi_Minh")
+
+
+class StreamStatus(StrEnum):
+    UPCOMING = "upcoming"
+    LIVE = "live"
+    ENDED = "ended"
+
+    @classmethod
+    def from_live_status(cls, live_status: str | None) -> "StreamStatus | None":
+        """Status of a yt-dlp live_status, None for anything not streaming."""
+        return _LIVE_STATUS.get(live_status)
+
+
+_LIVE_STATUS = {"is_upcoming": StreamStatus.UPCOMING, "is_live": StreamStatus.LIVE}
+
+
+def format_date(timestamp: int) -> str:
+    return datetime.fromtimestamp(timestamp, TIMEZONE).strftime(DATE_FORMAT)
+
+
+def parse_date(date: str) -> int:
+    # fromisoformat is much cheaper than strptime
+    return int(
+        datetime.fromisoformat(date.replace("/", "-"))
+        .replace(tzinfo=TIMEZONE)
+        .timestamp()
+    )
+
+
+@dataclass(slots=True)
+class Video:
+    """
+    One stream of a snapshot. Schedules are kept as epoch seconds and only
+    formatted when rendered or written back to the JSON shape.
+    """
+
+    video_id: str
+    title: str
+    status: StreamStatus
+    scheduled_at: int | None = None  # upcoming streams only
+    thumbnail: str | None = None
+    description: str | None = None
+
+    def to_dict(self) -> dict:
+        """Same shape as a video of upcoming.json / live_streams.json."""
+        data = {"video_id": self.video_id, "title": self.title}
+        if self.scheduled_at is not None:
+            data["date"] = format_date(self.scheduled_at)
+        data["thumbnail"] = self.thumbnail
+        data["description"] = self.description
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict, status: StreamStatus) -> "Video":
+        date = data.get("date")
+        return cls(
+            video_id=data["video_id"],
+            title=data.get("title", ""),
+            status=status,
+            scheduled_at=parse_date(date) if date else None,
+            thumbnail=data.get("thumbnail"),
+            description=data.get("description"),
+        )
+
+
+@dataclass(slots=True)
+class Channel:
+    channel_url: str | None
+    channel_name: str | None
+    avatar_url: str | None
+    videos: list[Video] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return {
+            "channel_url": self.channel_url,
+            "channel_name": self.channel_name,
+            "avatar_url": self.avatar_url,
+            "videos": [video.to_dict() for video in self.videos],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict, status: StreamStatus) -> "Channel":
+        return cls(
+            channel_url=data.get("channel_url"),
+            channel_name=data.get("channel_name"),
+            avatar_url=data.get("avatar_url"),
+            videos=[
+                Video.from_dict(video, status) for video in data.get("videos") or []
+            ],
+        )
+
+
+def snapshot_from_json(data: dict, status: StreamStatus) -> dict[str, Channel]:
+    """channel_id -> Channel of an upcoming.json / live_streams.json dict."""
+    return {
+        channel_id: Channel.from_dict(info, status) for channel_id, info in data.items()
+    }
+
+
+def snapshot_to_json(snapshot: dict[str, Channel]) -> dict:
+    return {channel_id: channel.to_dict() for channel_id, channel in snapshot.items()}
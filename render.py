@@ -0,0 +1,210 @@
+import html
+import json
+from hashlib import md5
+from pathlib import Path
+
+from models import Channel, Video
+
+RENDER_CACHE_PATH = "render_cache.json"
+
+# shared by every block instead of inline styles on each <li>
+CSS = """
+li.channel, li.video { list-style-type: none; }
+img.avatar { width: 60px; height: 60px; border-radius: 50%; margin-right: 4px; display: inline-block; }
+strong.channel-name { font-size: 18px; }
+li.video.soon { color: red; }
+li.video.unarchived-upcoming { color: blue; font-weight: bold; font-style: oblique; }
+li.video.unarchived-live { color: red; font-weight: bold; font-style: oblique; }
+span.label { font-weight: bold; padding: 3px; margin: 4px; border-radius: 30%; }
+span.label-new { background-color: greenyellow; }
+span.label-rescheduled { background-color: khaki; }
+span.label-title-changed { background-color: lightblue; }
+span.stream-id { font-weight: bold; font-family: consolas, 'Times New Roman', tahoma; font-size: x-large; }
+h2 { font-weight: bold; }
+"""
+
+# templates are built once at import and filled with str.format_map; a
+# rendered channel block is kept as the static segments around its SLOT
+# markers, the values that change on every run (countdown, "soon" class)
+SLOT = "\x00"
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="UTF-8">
+<style>{css}</style>
+</head>
+<body>
+<h1>{heading}</h1>
+<br />
+{summary}
+<ul>
+{channels}
+</ul>
+</body>
+</html>"""
+
+CHANNEL_TEMPLATE = """<li class="channel">
+<img class="avatar" src="{avatar_url}=s900-c-k-c0x00ffffff-no-rj" />
+<strong class="channel-name">{channel_name} ({channel_id})</strong> - <a href="{channel_url}"><strong>Visit Channel</strong></a>
+<ul>
+{videos}
+</ul>
+</li>"""
+
+VIDEO_TEMPLATE = """<hr />
+<li class="{classes}{soon}">
+<span><strong>🏷️ Title: </strong>{title}</span> {labels}
+<br />
+<span><strong>📝 Translated Title: </strong>{translated_title}</span>
+<br />
+<span><strong>🆔 Stream ID: </strong><span class="stream-id">{video_id}</span></span>
+<br />
+<span><strong>🖼️ Thumbnail: </strong> <img src="{thumbnail}"/></span>
+<br />
+{schedule}<a href="https://www.youtube.com/watch?v={video_id}"><strong>{link_text}</strong></a>
+</li>"""
+
+SCHEDULE_TEMPLATE = """<span><strong>{emoji} Scheduled for: </strong>{date} ({delta} from now)</span>
+<br />
+"""
+
+SUMMARY_TEMPLATE = '<h2 style="color: {color};">{text}</h2>'
+
+LABELS = {
+    "new": '<span class="label label-new">New!</span>',
+    "rescheduled": '<span class="label label-rescheduled">Rescheduled</span>',
+    "title-changed": '<span class="label label-title-changed">Title changed</span>',
+}
+
+
+def escape(value: str | None) -> str:
+    return html.escape(value or "").replace(SLOT, "")
+
+
+def video_context(
+    video: Video,
+    translated_title: str,
+    classes: list[str],
+    labels: list[str],
+    link_text: str,
+) -> dict:
+    """Static values rendered for one video, also part of the cache key."""
+    return {
+        "classes": " ".join(["video", *classes]),
+        "title": escape(video.title),
+        "labels": " ".join(labels),
+        "translated_title": escape(translated_title),
+        "video_id": escape(video.video_id),
+        "thumbnail": escape(video.thumbnail),
+        "link_text": link_text,
+    }
+
+
+def video_slots(soon: bool = False, schedule: dict | None = None) -> tuple[str, str]:
+    """Per-run values of one video, in the order of its SLOT markers."""
+    return (
+        " soon" if soon else "",
+        SCHEDULE_TEMPLATE.format_map(schedule) if schedule else "",
+    )
+
+
+def channel_context(channel_id: str, info: Channel) -> dict:
+    return {
+        "channel_id": escape(channel_id),
+        "channel_name": escape(info.channel_name),
+        "channel_url": escape(info.channel_url),
+        "avatar_url": escape(info.avatar_url),
+    }
+
+
+def render_channel(channel: dict, videos: list[dict]) -> list[str]:
+    """Static segments of a channel block, split at the per-run slots."""
+    return CHANNEL_TEMPLATE.format_map(
+        {
+            **channel,
+            "videos": "\n".join(
+                VIDEO_TEMPLATE.format_map({**video, "soon": SLOT, "schedule": SLOT})
+                for video in videos
+            ),
+        }
+    ).split(SLOT)
+
+
+def fill_slots(segments: list[str], slots: list[tuple[str, str]]) -> str:
+    values = [value for video_slots_ in slots for value in video_slots_]
+    parts = [segments[0]]
+    for value, segment in zip(values, segments[1:]):
+        parts.append(value)
+        parts.append(segment)
+    return "".join(parts)
+
+
+def render_summary(lines: list[tuple[str, str]]) -> str:
+    return "\n".join(
+        SUMMARY_TEMPLATE.format(color=color, text=text) for color, text in lines
+    )
+
+
+def render_page(heading: str, summary: str, blocks: list[str]) -> str:
+    return PAGE_TEMPLATE.format_map(
+        {
+            "css": CSS,
+            "heading": heading,
+            "summary": summary,
+            "channels": "\n".join(blocks),
+        }
+    )
+
+
+class BlockCache:
+    """
+    Rendered channel blocks keyed by the hash of their render context, kept
+    between runs so unchanged channels are not formatted again. Blocks not
+    used by the last run are dropped on save.
+    """
+
+    def __init__(self, path: str | None = RENDER_CACHE_PATH):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._blocks = {}
+        self._used = {}
+        if path and Path(path).exists():
+            try:
+                with open(path, mode="r", encoding="utf-8") as file:
+                    self._blocks = json.load(file)
+            except (OSError, ValueError):
+                self._blocks = {}
+
+    @staticmethod
+    def key(channel: dict, videos: list[dict]) -> str:
+        # contexts always have the same keys in the same order
+        values = [*channel.values()]
+        for video in videos:
+            values.extend(video.values())
+        return md5(SLOT.join(values).encode("utf-8")).hexdigest()
+
+    def render(
+        self, channel: dict, videos: list[dict], slots: list[tuple[str, str]]
+    ) -> str:
+        key = self.key(channel, videos)
+        block = self._blocks.get(key)
+        if block is None:
+            self.misses += 1
+            block = render_channel(channel, videos)
+            self._blocks[key] = block
+        else:
+            self.hits += 1
+        self._used[key] = block
+        return fill_slots(block, slots)
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        with open(self.path, mode="w", encoding="utf-8") as file:
+            json.dump(self._used, file, ensure_ascii=False)
+        self._blocks = dict(self._used)
+        self._used = {}
+
+    def stats(self) -> str:
+        return f"Render cache: {self.hits} blocks reused, {self.misses} rendered"
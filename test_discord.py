@@ -0,0 +1,62 @@
+import main
+from main import DISCORD_MAX_LENGTH, DiscordWebhook
+
+
+class Response:
+    def __init__(self, status_code: int, body: dict | None = None, headers=None):
+        self.status_code = status_code
+        self.body = body or {}
+        self.headers = headers or {}
+        self.text = ""
+
+    def json(self) -> dict:
+        return self.body
+
+
+class Session:
+    def __init__(self, responses: list[Response]):
+        self.responses = responses
+        self.payloads = []
+
+    def post(self, url, json, timeout):
+        self.payloads.append(json)
+        return self.responses.pop(0)
+
+
+def long_message() -> str:
+    sections = []
+    for channel in range(12):
+        lines = [f"## Channel {channel} (UC{channel})\n---\n"]
+        for video in range(4):
+            lines.append(
+                f"- Title: stream {channel}-{video} {'karaoke ' * 5}\n"
+                f"- Stream ID: [v{channel}{video}](https://www.youtube.com/watch?v=v{channel}{video})\n---\n"
+            )
+        sections.append("".join(lines))
+    return "# Header\n" + "".join(sections)
+
+
+def test_long_message_is_split_on_line_boundaries():
+    message = long_message()
+    assert len(message) > DISCORD_MAX_LENGTH
+    chunks = DiscordWebhook("https://discord.invalid/webhook").split(message)
+
+    assert len(chunks) > 1
+    assert all(len(chunk) <= DISCORD_MAX_LENGTH for chunk in chunks)
+    assert all(chunk.endswith("\n") for chunk in chunks)
+    assert "".join(chunks) == message
+    # sections fit, so every chunk after the first starts with a channel
+    assert all(chunk.startswith("## ") for chunk in chunks[1:])
+
+
+def test_rate_limited_post_is_retried(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(main.time, "sleep", sleeps.append)
+    webhook = DiscordWebhook("https://discord.invalid/webhook")
+    webhook.session = Session([Response(429, {"retry_after": 0.25}), Response(204)])
+
+    assert webhook.post({"content": "hello"})
+    assert len(webhook.session.payloads) == 2
+    assert webhook.rate_limited == 1
+    assert webhook.sent == 1
+    assert len(sleeps) == 1 and 0 < sleeps[0] <= 0.25
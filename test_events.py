@@ -0,0 +1,104 @@
+import pytest
+
+import main
+from main import EventKind, diff_streams
+from models import Channel, StreamStatus, Video
+
+NOW = 1_800_000_000
+
+
+def upcoming(*videos: Video, channel_id: str = "UC1") -> dict:
+    return {
+        channel_id: Channel(
+            f"https://www.youtube.com/@{channel_id}", channel_id, None, list(videos)
+        )
+    }
+
+
+def live(*videos: Video, channel_id: str = "UC1") -> dict:
+    return upcoming(*videos, channel_id=channel_id)
+
+
+def video(video_id: str, status=StreamStatus.UPCOMING, title="title", at=NOW):
+    return Video(
+        video_id, title, status, at if status == StreamStatus.UPCOMING else None
+    )
+
+
+def kinds(events) -> set[tuple[str, str]]:
+    return {(event.kind, event.video_id) for event in events}
+
+
+def test_unchanged_snapshot_has_no_events():
+    previous = upcoming(video("a"))
+    assert diff_streams(previous, {}, upcoming(video("a")), {}) == []
+
+
+def test_new_and_removed_streams():
+    events = diff_streams(upcoming(video("a")), {}, upcoming(video("b")), {})
+    assert kinds(events) == {(EventKind.ADDED, "b"), (EventKind.REMOVED, "a")}
+    removed = next(event for event in events if event.kind == EventKind.REMOVED)
+    assert removed.status == StreamStatus.UPCOMING
+
+
+def test_upcoming_stream_went_live():
+    events = diff_streams(
+        upcoming(video("a")), {}, {}, live(video("a", StreamStatus.LIVE))
+    )
+    assert kinds(events) == {(EventKind.WENT_LIVE, "a")}
+    assert events[0].previous.status == StreamStatus.UPCOMING
+
+
+def test_rescheduled_and_title_changed():
+    events = diff_streams(
+        upcoming(video("a"), video("b")),
+        {},
+        upcoming(video("a", at=NOW + 3600), video("b", title="new title")),
+        {},
+    )
+    assert kinds(events) == {
+        (EventKind.RESCHEDULED, "a"),
+        (EventKind.TITLE_CHANGED, "b"),
+    }
+
+
+def test_stream_moving_to_another_channel_is_not_new():
+    events = diff_streams(
+        upcoming(video("a"), channel_id="UC1"),
+        {},
+        upcoming(video("a"), channel_id="UC2"),
+        {},
+    )
+    assert events == []
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    store = main.StateStore(str(tmp_path / "state.db"))
+    monkeypatch.setattr(main, "state_store", store)
+    monkeypatch.setattr(main, "fetch_governor", main.FetchGovernor(rate=float("inf")))
+    yield store
+    store.close()
+
+
+def test_failed_channel_keeps_its_previous_state(store, monkeypatch):
+    ok_url = "https://www.youtube.com/@UC1"
+    failed_url = "https://www.youtube.com/@UC2"
+    store.save_run(
+        {**upcoming(video("a")), **upcoming(video("b"), channel_id="UC2")},
+        live(channel_id="UC1") | live(channel_id="UC2"),
+    )
+
+    def process_channels(channel_urls, *args, **kwargs):
+        main.get_fetch_governor().failure(failed_url, "HTTP Error 500")
+        return upcoming(video("c")), live()
+
+    monkeypatch.setattr(main, "process_channels", process_channels)
+    new_upcoming, _ = main.fetch_channels([ok_url, failed_url], mode="thread")
+
+    assert [v.video_id for v in new_upcoming["UC1"].videos] == ["c"]
+    # unknown, not "every stream ended"
+    assert [v.video_id for v in new_upcoming["UC2"].videos] == ["b"]
+    events = diff_streams(store.snapshot(StreamStatus.UPCOMING), {}, new_upcoming, {})
+    assert kinds(events) == {(EventKind.ADDED, "c"), (EventKind.REMOVED, "a")}
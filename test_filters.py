@@ -0,0 +1,43 @@
+import pytest
+
+from main import FILTERS, FilterMatcher
+
+
+@pytest.fixture(scope="module")
+def matcher():
+    return FilterMatcher(FILTERS)
+
+
+@pytest.mark.parametrize(
+    "title, category",
+    [
+        ("karaoke配信", "Karaoke"),
+        ("【歌枠】karaoke！", "Karaoke"),
+        ("test配信", "Test"),
+        ("配信test", "Test"),
+        ("【test】マイクテスト", "Test"),
+        ("sing歌う", "Karaoke"),
+        ("アーカイブなし", "Unarchived"),
+        ("unarchived雑談", "Unarchived"),
+        ("ＴＥＳＴ配信", "Test"),  # full width, NFKC
+    ],
+)
+def test_mixed_script_titles_match(matcher, title, category):
+    assert category in matcher.match(title)
+
+
+@pytest.mark.parametrize(
+    "title, category",
+    [
+        ("closing stream", "Karaoke"),
+        ("contest配信", "Test"),
+        ("tester2", "Test"),
+        ("test2", "Test"),
+    ],
+)
+def test_latin_words_inside_words_do_not_match(matcher, title, category):
+    assert category not in matcher.match(title)
+
+
+def test_description_is_matched(matcher):
+    assert matcher.match("雑談", "no archive") == {"Unarchived"}
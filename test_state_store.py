@@ -0,0 +1,106 @@
+import pytest
+
+from main import StateStore, hash_channels
+from models import Channel, StreamStatus, Video
+
+NOW = 1_800_000_000
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    # the store imports legacy JSON files from the working directory
+    monkeypatch.chdir(tmp_path)
+    store = StateStore(str(tmp_path / "state.db"))
+    yield store
+    store.close()
+
+
+def snapshots():
+    upcoming = {
+        "UC1": Channel(
+            "https://www.youtube.com/@one",
+            "One",
+            "https://yt3.googleusercontent.com/one",
+            [
+                Video("a", "歌枠 karaoke", StreamStatus.UPCOMING, NOW, "thumb", "desc"),
+                Video("b", "雑談", StreamStatus.UPCOMING, NOW + 60),
+            ],
+        ),
+        "UC2": Channel("https://www.youtube.com/@two", "Two", None, []),
+    }
+    live_streams = {
+        "UC1": Channel(
+            "https://www.youtube.com/@one",
+            "One",
+            "https://yt3.googleusercontent.com/one",
+            [Video("c", "live now", StreamStatus.LIVE)],
+        ),
+        "UC2": Channel("https://www.youtube.com/@two", "Two", None, []),
+    }
+    return upcoming, live_streams
+
+
+def test_fresh_store_is_first_run(store):
+    assert store.is_first_run()
+    assert store.snapshot(StreamStatus.UPCOMING) == {}
+
+
+def test_snapshots_round_trip(store):
+    upcoming, live_streams = snapshots()
+    store.save_run(upcoming, live_streams)
+    assert store.snapshot(StreamStatus.UPCOMING) == upcoming
+    assert store.snapshot(StreamStatus.LIVE) == live_streams
+    assert not store.is_first_run()
+
+
+def test_hashes_round_trip(store):
+    upcoming, live_streams = snapshots()
+    hashes = {"upcoming": hash_channels(upcoming), "live": hash_channels(live_streams)}
+    store.save_run(upcoming, live_streams, hashes)
+    assert store.hashes() == hashes
+    # channels without videos are not hashed
+    assert set(store.hashes()["upcoming"]) == {"UC1"}
+
+
+def test_status_transitions(store):
+    upcoming, live_streams = snapshots()
+    store.save_run(upcoming, live_streams)
+    went_live = upcoming["UC1"].videos.pop(0)
+    went_live.status = StreamStatus.LIVE
+    went_live.scheduled_at = None
+    live_streams["UC1"].videos = [went_live]
+    store.save_run(upcoming, live_streams)
+
+    transitions = store.conn.execute(
+        "SELECT video_id, old_status, new_status FROM transitions ORDER BY rowid"
+    ).fetchall()
+    assert transitions[-2:] == [("a", "upcoming", "live"), ("c", "live", "ended")]
+    assert store.snapshot(StreamStatus.LIVE)["UC1"].videos == [went_live]
+
+
+def test_run_records(store):
+    store.record_run(
+        {
+            "started_at": "2026/10/18-10:00:00",
+            "seconds": 1.5,
+            "channels": 3,
+            "upcoming": 0,
+            "live": 0,
+        }
+    )
+    assert not store.is_first_run()
+    assert store.conn.execute("SELECT channels FROM runs").fetchall() == [(3,)]
+
+
+def test_close_checkpoints_the_wal(tmp_path, monkeypatch):
+    # the workflow commits state.db without its -wal file
+    monkeypatch.chdir(tmp_path)
+    store = StateStore(str(tmp_path / "state.db"))
+    store.save_run(*snapshots())
+    store.close()
+
+    wal = tmp_path / "state.db-wal"
+    assert not wal.exists() or wal.stat().st_size == 0
+    reopened = StateStore(str(tmp_path / "state.db"))
+    assert reopened.snapshot(StreamStatus.LIVE) == snapshots()[1]
+    reopened.close()